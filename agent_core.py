@@ -1,20 +1,39 @@
 import sys
 import os
 import re
-import smtplib
-from email.mime.text import MIMEText
-from dotenv import load_dotenv
+import threading
+import time
+import contextlib
+import random
+import concurrent.futures
+
+from config import load_config
+from metrics import stage, timed
+from ingest import iter_file_text, read_file_content
+from recipients import get_directory, normalize_address, RecipientIndex
 
 # --- NEW: Import LLM functions from your ai_service.py file ---
-from llm_service import generate_subject_with_llm, reformat_minutes_with_llm
+from llm_service import generate_subject_with_llm, reformat_minutes_with_llm, generate_subject_and_minutes, stream_subject_and_minutes
+from llm_service import generate_minutes_record_or_fallback, LLMUnavailableError
+from llm_service import warm_up as llm_warm_up
 
 # --- Configuration (Loaded only once per process) ---
-load_dotenv()
+# smtplib and email.mime are imported on first send, keeping startup light.
+load_config()
 
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 APP_PASSWORD = os.getenv("GMAIL_PASSWORD")
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))  # also the number of bulk batches sent in parallel
+SMTP_IDLE_TIMEOUT = 120  # seconds before an unused connection is closed
+
+# Lists longer than one batch are sent in bulk mode: several messages of at most
+# SMTP_BATCH_SIZE recipients each, addressed via Bcc (or Cc) and sent in parallel.
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "50"))
+SMTP_BULK_HEADER = os.getenv("SMTP_BULK_HEADER", "bcc").lower()  # "bcc" or "cc"
+SMTP_BATCH_ATTEMPTS = 3
+SMTP_RETRY_BACKOFF = 2.0  # seconds, doubled per attempt
 
 # Validate that credentials were loaded
 if not SENDER_EMAIL or not APP_PASSWORD:
@@ -22,59 +41,433 @@ if not SENDER_EMAIL or not APP_PASSWORD:
     print("Ensure your .env file looks like this:\nSENDER_EMAIL=\"your.email@gmail.com\"\nGMAIL_PASSWORD=\"your_16_digit_app_password\"")
     sys.exit(1)
 
+# --- SMTP Connection Pool ---
+
+class SMTPConnectionPool:
+    """
+    Keeps logged-in SMTP sessions around between sends so back-to-back
+    dispatches skip the TCP, TLS and AUTH handshakes. Connections are opened
+    lazily, checked with NOOP before reuse, and closed after idle_timeout.
+    Pass use_starttls=False and no credentials to target a local test server.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_starttls=True,
+                 max_size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_starttls = use_starttls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (server, last_used)
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def _connect(self):
+        import smtplib
+        with stage("smtp.connect"):
+            server = smtplib.SMTP(self.host, self.port)
+        try:
+            if self.use_starttls:
+                with stage("smtp.starttls"):
+                    server.starttls()
+            if self.username:
+                with stage("smtp.login"):
+                    server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Returns a healthy connection, reusing an idle one when possible."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout and self._is_alive(server):
+                return server
+            self._close(server)
+        return self._connect()
+
+    def release(self, server):
+        """Returns a connection to the pool, closing it if the pool is full."""
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((server, time.monotonic()))
+                self._schedule_reap()
+                return
+        self._close(server)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrows a connection; it is discarded instead of reused if the block raises."""
+        server = self.acquire()
+        try:
+            yield server
+        except Exception:
+            self._close(server)
+            raise
+        self.release(server)
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Sends over a pooled connection, reconnecting once if it was dropped."""
+        import smtplib
+        try:
+            with self.connection() as server, stage("smtp.send"):
+                return server.sendmail(from_addr, to_addrs, msg)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection() as server, stage("smtp.send", retry="true"):
+                return server.sendmail(from_addr, to_addrs, msg)
+
+    def _schedule_reap(self):
+        # Caller holds self._lock. Wake up when the oldest idle connection expires.
+        if self._reaper is None and self._idle:
+            oldest = min(last_used for _, last_used in self._idle)
+            delay = max(0.0, self.idle_timeout - (time.monotonic() - oldest))
+            self._reaper = threading.Timer(delay, self.close_idle, kwargs={"only_expired": True})
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def close_idle(self, only_expired=False):
+        """Closes idle connections (all of them, or only those past idle_timeout)."""
+        now = time.monotonic()
+        with self._lock:
+            self._reaper = None
+            if only_expired:
+                expired = [entry for entry in self._idle if now - entry[1] >= self.idle_timeout]
+                self._idle = [entry for entry in self._idle if now - entry[1] < self.idle_timeout]
+            else:
+                expired, self._idle = self._idle, []
+            self._schedule_reap()
+        for server, _ in expired:
+            self._close(server)
+
+
+_smtp_pool = SMTPConnectionPool(SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, APP_PASSWORD)
+
+
+def set_smtp_pool(pool):
+    """Replaces the shared SMTP pool, e.g. to point sends at a local sink server."""
+    global _smtp_pool
+    old_pool, _smtp_pool = _smtp_pool, pool
+    old_pool.close_idle()
+
+# --- Text Scanning ---
+
+# Precompiled and only run on whitespace-free tokens that contain an '@'.
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+SCAN_CHUNK_SIZE = 1 << 20  # characters read per step when scanning a stream
+
+
+class TextScanner:
+    """
+    Single-pass normalizer and email collector. Feed text in chunks of any
+    size: each call returns the next piece of whitespace-normalized text
+    (runs of whitespace, including non-breaking spaces, become one space)
+    and collects case-folded, deduplicated addresses along the way. A token
+    split across chunks is held back until the next feed() or finish().
+    """
+
+    def __init__(self):
+        self._emails = {}  # ordered set of case-folded addresses
+        self._tail = ""
+        self._emitted = False
+
+    def _collect(self, piece):
+        # Normalized text only has single spaces between tokens, so each '@'
+        # can be widened to its token with two C-level scans.
+        find = piece.find
+        pos = find('@')
+        while pos != -1:
+            start = piece.rfind(' ', 0, pos) + 1
+            end = find(' ', pos)
+            if end == -1:
+                end = len(piece)
+            for email in EMAIL_RE.findall(piece, start, end):
+                self._emails.setdefault(email.lower(), None)
+            pos = find('@', end)
+
+    def _emit(self, tokens):
+        if not tokens:
+            return ""
+        piece = " ".join(tokens)
+        self._collect(piece)
+        if self._emitted:
+            piece = " " + piece
+        self._emitted = True
+        return piece
+
+    def feed(self, chunk):
+        data = self._tail + chunk if self._tail else chunk
+        tokens = data.split()
+        if tokens and not data[-1].isspace():
+            self._tail = tokens.pop()
+        else:
+            self._tail = ""
+        return self._emit(tokens)
+
+    def finish(self):
+        tokens = [self._tail] if self._tail else []
+        self._tail = ""
+        return self._emit(tokens)
+
+    @property
+    def emails(self):
+        return list(self._emails)
+
+
+def clean_and_extract(text):
+    """Normalizes text and extracts its email addresses in one sweep. Returns (cleaned, emails)."""
+    scanner = TextScanner()
+    cleaned = scanner.feed(text) + scanner.finish()
+    return cleaned, scanner.emails
+
+def scan_text_stream(stream, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Like clean_and_extract() for a text file object: reads it in chunks so only
+    the normalized output is ever held in memory. Returns (cleaned, emails).
+    """
+    return scan_text_pieces(iter(lambda: stream.read(chunk_size), ""))
+
+def scan_text_pieces(pieces):
+    """Normalizes and extracts emails from an iterable of text pieces. Returns (cleaned, emails)."""
+    scanner = TextScanner()
+    output = [scanner.feed(piece) for piece in pieces]
+    output.append(scanner.finish())
+    return "".join(output), scanner.emails
+
 # --- Helper Functions (Core Agent Logic) ---
 
+@timed("clean_text")
 def clean_text(text):
     """Cleans the input text by replacing non-breaking spaces and normalizing other whitespace."""
-    text = text.replace('\u00a0', ' ')
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    # str.split() already treats \u00a0 and every other Unicode space as whitespace.
+    return " ".join(text.split())
 
-def send_email_collective(to_email, cc_emails, subject, body):
+def format_email_body(minutes):
+    """Wraps the reformatted minutes in the standard email greeting/sign-off."""
+    return f"Dear Team,\n\nPlease find the meeting minutes below:\n\n{minutes}\n\nBest regards,\nYour Meeting Dispatcher Agent"
+
+def _build_message(to_email, cc_emails, subject, body, message_id=None):
+    from email.mime.text import MIMEText
+    msg = MIMEText(body, 'plain', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = to_email
+    if message_id:
+        msg['Message-ID'] = message_id
+    if cc_emails:
+        msg['Cc'] = ", ".join(cc_emails)
+    return msg.as_string()
+
+def _send_batch(envelope, message):
     """
-    Sends a single email with a primary recipient and multiple CC recipients,
-    using plain text.
+    Sends one message to a batch of envelope recipients, retrying transient
+    failures. Returns (delivered, refused, failed): refused maps addresses
+    the server permanently rejected, failed those still undelivered after
+    SMTP_BATCH_ATTEMPTS.
     """
-    try:
-        msg = MIMEText(body, 'plain', 'utf-8')
-        msg['Subject'] = subject
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = to_email
+    import smtplib
+    pending = list(envelope)
+    delivered, refused = [], {}
+    error = None
+    for attempt in range(1, SMTP_BATCH_ATTEMPTS + 1):
+        try:
+            with stage("smtp.batch", attempt=str(attempt)):
+                rejected = _smtp_pool.sendmail(SENDER_EMAIL, pending, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            rejected = e.recipients
+        except smtplib.SMTPResponseException as e:
+            error = f"{e.smtp_code} {e.smtp_error.decode('utf-8', 'replace') if isinstance(e.smtp_error, bytes) else e.smtp_error}"
+            if 500 <= e.smtp_code < 600:
+                refused.update((address, error) for address in pending)
+                pending = []
+                break
+            rejected = None
+        except (smtplib.SMTPException, OSError) as e:
+            error = f"{type(e).__name__}: {e}"
+            rejected = None
+
+        if rejected is not None:
+            retry = []
+            for address in pending:
+                if address not in rejected:
+                    delivered.append(address)
+                    continue
+                code, reason = rejected[address]
+                reason = f"{code} {reason.decode('utf-8', 'replace') if isinstance(reason, bytes) else reason}"
+                if 400 <= code < 500:
+                    retry.append(address)
+                    error = reason
+                else:
+                    refused[address] = reason
+            pending = retry
+            if not pending:
+                break
+        if attempt < SMTP_BATCH_ATTEMPTS:
+            time.sleep(SMTP_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+
+    return delivered, refused, {address: error or "Not delivered." for address in pending}
 
-        if cc_emails:
-            msg['Cc'] = ", ".join(cc_emails)
+def send_email_bulk(to_email, recipients, subject, body, message_id=None,
+                    batch_size=SMTP_BATCH_SIZE, header_mode=SMTP_BULK_HEADER):
+    """
+    Sends to a large recipient list in batches of at most batch_size, in
+    parallel over the SMTP pool. Recipients are listed in a Cc header
+    (header_mode="cc") or only in the envelope (Bcc, the default); the
+    primary recipient rides with the first batch. Each batch is retried on
+    its own, so a failure never resends to recipients already delivered.
+
+    Returns a per-recipient report: {"delivered": [...], "refused": {address:
+    reason}, "failed": {address: reason}, "batches": n}. Refused addresses
+    were permanently rejected; failed ones may succeed on a later resend.
+    """
+    recipients = RecipientIndex(normalize_address(a) or a for a in recipients)
+    primary = normalize_address(to_email) or to_email
+    recipients.discard(primary)
+    recipients = recipients.addresses()
+    batch_size = max(1, batch_size)
+    batches = [recipients[i:i + batch_size] for i in range(0, len(recipients), batch_size)] or [[]]
+    report = {"delivered": [], "refused": {}, "failed": {}, "batches": len(batches)}
 
-        all_recipients = [to_email] + list(cc_emails)
-        all_recipients = list(set(all_recipients))
+    def send(index):
+        batch = batches[index]
+        envelope = ([primary] if index == 0 else []) + batch
+        message = _build_message(to_email, batch if header_mode == "cc" else (), subject, body, message_id)
+        return _send_batch(envelope, message)
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, APP_PASSWORD)
-            server.sendmail(SENDER_EMAIL, all_recipients, msg.as_string())
+    workers = min(len(batches), max(1, _smtp_pool.max_size))
+    with stage("smtp.bulk", header=header_mode):
+        if workers == 1:
+            results = [send(i) for i in range(len(batches))]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smtp") as executor:
+                results = list(executor.map(send, range(len(batches))))
+    for delivered, refused, failed in results:
+        report["delivered"].extend(delivered)
+        report["refused"].update(refused)
+        report["failed"].update(failed)
+    return report
 
-        print(f"✅ Email sent successfully to {to_email} (To) and {len(cc_emails)} (Cc) recipients.")
-        return True
+def deliver_email(to_email, cc_emails, subject, body, message_id=None):
+    """
+    Sends the minutes and returns the per-recipient report of send_email_bulk().
+    Lists that fit in one batch go out as a single message with a Cc header;
+    longer ones use bulk mode. A fixed message_id lets mail systems recognise
+    a resend of the same dispatch as a duplicate.
+    """
+    try:
+        if len(cc_emails) > SMTP_BATCH_SIZE:
+            return send_email_bulk(to_email, cc_emails, subject, body, message_id=message_id)
+        return send_email_bulk(to_email, cc_emails, subject, body, message_id=message_id,
+                               batch_size=max(1, len(cc_emails)), header_mode="cc")
     except Exception as e:
-        print(f"❌ Failed to send collective email: {e}")
-        return False
+        reason = f"{type(e).__name__}: {e}"
+        return {"delivered": [], "refused": {}, "failed": {a: reason for a in [to_email, *cc_emails]}, "batches": 0}
+
+def print_delivery_report(report):
+    """Prints a one-line outcome plus each address that did not get the email."""
+    total = len(report["delivered"]) + len(report["refused"]) + len(report["failed"])
+    if report["delivered"] and not report["refused"] and not report["failed"]:
+        batches = f" in {report['batches']} batches" if report["batches"] > 1 else ""
+        print(f"✅ Email sent successfully to {len(report['delivered'])} recipient(s){batches}.")
+        return
+    marker = "⚠️" if report["delivered"] else "❌"
+    print(f"{marker} Email delivered to {len(report['delivered'])} of {total} recipient(s).")
+    for address, reason in report["refused"].items():
+        print(f"   ❌ {address}: rejected ({reason})")
+    for address, reason in report["failed"].items():
+        print(f"   ⚠️ {address}: not delivered ({reason})")
+
+def send_email_collective(to_email, cc_emails, subject, body, message_id=None):
+    """
+    Sends the minutes to a primary recipient and the CC list (in bulk batches
+    when the list is long). Returns True if no recipient was left undelivered
+    by a transient failure; permanently rejected addresses are reported only.
+    """
+    report = deliver_email(to_email, cc_emails, subject, body, message_id=message_id)
+    print_delivery_report(report)
+    return bool(report["delivered"]) and not report["failed"]
     
+@timed("extract_emails")
 def extract_emails(text):
-    """Extracts all unique email addresses from a given text using regex."""
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    return list(set(re.findall(email_pattern, text)))
+    """Extracts all unique email addresses (case-folded, in order of first appearance)."""
+    scanner = TextScanner()
+    scanner.feed(text)
+    scanner.finish()
+    return scanner.emails
+
+def parse_manual_recipients(additional_emails_str):
+    """Splits a comma-separated recipients field into a set of addresses."""
+    if not additional_emails_str:
+        return set()
+    return set(email.strip() for email in additional_emails_str.split(',') if email.strip())
+
+def resolve_recipients(extracted_emails, additional_emails_str="", exclude=()):
+    """
+    Merges extracted and manually entered recipients through the recipient
+    directory (aliases expanded, case-folded, validated, deduplicated).
+    Returns (recipients, rejected) where rejected maps entry -> reason.
+    """
+    entries = list(extracted_emails) + sorted(parse_manual_recipients(additional_emails_str))
+    with stage("recipients.resolve"):
+        index, rejected = get_directory().resolve(entries, exclude=exclude)
+    return index.addresses(), rejected
 
-def read_file_content(filepath):
-    """Reads content from a .txt file. Placeholder for PDF/DOCX."""
+def collect_recipients(cleaned_minutes, additional_emails_str=""):
+    """
+    Returns (extracted_emails, manual_emails) as sets: addresses found in the
+    minutes text and those from a comma-separated manual list.
+    """
+    return set(extract_emails(cleaned_minutes)), parse_manual_recipients(additional_emails_str)
+
+def warm_up_services():
+    """
+    Pre-imports the SMTP/email modules and builds the Gemini client so the
+    first dispatch doesn't pay for them. Safe to run on a background thread.
+    """
+    import smtplib  # noqa: F401
+    from email.mime.text import MIMEText  # noqa: F401
+    try:
+        llm_warm_up()
+    except Exception as e:
+        print(f"⚠️ Background warm-up failed: {type(e).__name__}: {e}")
+
+@timed("read_and_scan_file")
+def read_and_scan_file(filepath):
+    """
+    Streams a minutes file straight into the normalizer, so peak memory stays
+    flat for huge transcripts. Returns (cleaned_text, emails), or (None, [])
+    if the file can't be read.
+    """
     if not os.path.exists(filepath):
         print(f"❌ Error: File not found at '{filepath}'")
-        return None
+        return None, []
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
+        return scan_text_pieces(iter_file_text(filepath))
     except Exception as e:
         print(f"❌ Error reading file '{filepath}': {e}")
-        return None
+        return None, []
 
 # --- Wrapper functions for LLM calls from ai_service.py ---
 def get_llm_generated_subject(minutes_text):
@@ -89,4 +482,29 @@ def get_llm_reformatted_minutes(minutes_text):
     Calls the AI service (ai_service.py) to reformat meeting minutes.
     This function acts as a bridge.
     """
-    return reformat_minutes_with_llm(minutes_text)
\ No newline at end of file
+    return reformat_minutes_with_llm(minutes_text)
+
+def get_llm_subject_and_minutes(minutes_text, fallback=True, revisions=None):
+    """
+    Calls the AI service (ai_service.py) to generate the subject and reformat
+    the minutes concurrently. Returns a (subject, minutes) pair. With
+    fallback=False an LLM failure raises LLMUnavailableError instead of
+    returning the error subject and the raw notes. Pass the session's
+    RevisionStore to revise small edits incrementally.
+    """
+    return generate_subject_and_minutes(minutes_text, fallback=fallback, revisions=revisions)
+
+def get_llm_minutes_record(minutes_text, fallback=True):
+    """
+    Calls the AI service (ai_service.py) for the subject, reformatted minutes,
+    action items and attendees, in one structured request when possible.
+    """
+    return generate_minutes_record_or_fallback(minutes_text, fallback=fallback)
+
+def stream_llm_subject_and_minutes(minutes_text, fallback=True, revisions=None):
+    """
+    Calls the AI service (ai_service.py) to stream the reformatted minutes
+    while the subject is generated. Yields ("minutes", chunk) and
+    ("subject", subject) events.
+    """
+    return stream_subject_and_minutes(minutes_text, fallback=fallback, revisions=revisions)
@@ -0,0 +1,226 @@
+"""
+Headless batch mode: dispatches every minutes file in a directory (or glob)
+without the GUI.
+
+    python batch_dispatch.py notes/ --workers 8 --summary results.json
+    python batch_dispatch.py "notes/*.vtt" --dry-run
+
+Meetings run concurrently; the LLM and SMTP stages each have their own
+concurrency limit so a large backlog doesn't flood either service.
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+from agent_core import (
+    resolve_recipients,
+    read_and_scan_file,
+    deliver_email,
+    SENDER_EMAIL,
+    format_email_body,
+    get_llm_subject_and_minutes,
+    get_llm_minutes_record,
+    LLMUnavailableError
+)
+from ingest import SUPPORTED_EXTENSIONS
+from job_queue import JobQueue, JobWorkerPool, BATCH_QUEUE_PATH, STATE_SENDING, STATE_SENT, send_job
+from llm_service import get_cache_stats, get_resilience_state
+import metrics
+
+DEFAULT_PATTERNS = tuple(f"*{extension}" for extension in sorted(SUPPORTED_EXTENSIONS))
+
+
+def find_minutes_files(target, patterns=DEFAULT_PATTERNS):
+    """Expands a directory or glob pattern into a sorted list of files."""
+    if os.path.isdir(target):
+        files = []
+        for pattern in patterns:
+            files.extend(glob.glob(os.path.join(target, pattern)))
+    else:
+        files = glob.glob(target)
+    return sorted(f for f in set(files) if os.path.isfile(f))
+
+
+class BatchDispatcher:
+    """Runs the dispatch pipeline for many files with bounded LLM/SMTP concurrency."""
+
+    def __init__(self, llm_concurrency=4, smtp_concurrency=2, additional_emails_str="", dry_run=False, job_queue=None):
+        self.job_queue = job_queue
+        self._llm_slots = threading.BoundedSemaphore(llm_concurrency)
+        self._smtp_slots = threading.BoundedSemaphore(smtp_concurrency)
+        self.additional_emails_str = additional_emails_str
+        self.dry_run = dry_run
+
+    def dispatch_file(self, filepath):
+        """Dispatches one minutes file and returns a JSON-serialisable result."""
+        started = time.perf_counter()
+        result = {"file": filepath, "status": "failed", "subject": None, "recipients": [], "error": None}
+        try:
+            cleaned_minutes, extracted_emails = read_and_scan_file(filepath)
+            if not cleaned_minutes:
+                result["status"] = "skipped"
+                result["error"] = "File is empty or could not be read."
+                return result
+
+            cc_recipients, rejected = resolve_recipients(extracted_emails, self.additional_emails_str, exclude=[SENDER_EMAIL])
+            cc_recipients.sort()
+            result["recipients"] = cc_recipients
+            if rejected:
+                result["rejected"] = rejected
+            if not cc_recipients:
+                result["status"] = "skipped"
+                result["error"] = "No valid email addresses found."
+                return result
+
+            if self.job_queue is not None:
+                return self._dispatch_queued(result, cleaned_minutes, cc_recipients)
+
+            # No one previews a batch send, so an LLM failure fails the file instead of mailing the raw notes.
+            with self._llm_slots:
+                record = get_llm_minutes_record(cleaned_minutes, fallback=False)
+            meeting_subject, detailed_description = record["subject"], record["minutes"]
+            result["subject"] = meeting_subject
+            result["action_items"] = record["action_items"]
+            result["attendees"] = record["attendees"]
+
+            if self.dry_run:
+                result["status"] = "dry_run"
+                return result
+
+            with self._smtp_slots:
+                report = deliver_email(SENDER_EMAIL, cc_recipients, meeting_subject, format_email_body(detailed_description))
+            result["delivery"] = {
+                "delivered": len(report["delivered"]),
+                "batches": report["batches"],
+                "refused": report["refused"],
+                "failed": report["failed"],
+            }
+            if report["delivered"] and not report["failed"]:
+                result["status"] = "sent"
+            elif report["delivered"]:
+                result["status"] = "partial"
+                result["error"] = f"{len(report['failed'])} recipient(s) not delivered."
+            else:
+                result["error"] = "SMTP send failed."
+            return result
+        except LLMUnavailableError as e:
+            result["error"] = f"AI generation failed ({e}); not sent."
+            return result
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            return result
+        finally:
+            result["seconds"] = round(time.perf_counter() - started, 3)
+
+    def _dispatch_queued(self, result, cleaned_minutes, cc_recipients):
+        """Queue-backed path: reuses stored LLM output and never re-sends a sent job."""
+        job = self.job_queue.enqueue(cleaned_minutes, SENDER_EMAIL, cc_recipients, source=result["file"],
+                                     auto_approve=not self.dry_run, lease=True)
+        result["job_id"] = job["id"]
+        if job["state"] in (STATE_SENDING, STATE_SENT):
+            result["status"] = "already_sent"
+            result["subject"] = job["subject"]
+            return result
+
+        if job["minutes"] is None:
+            try:
+                with self._llm_slots:
+                    subject, minutes = get_llm_subject_and_minutes(cleaned_minutes, fallback=False)
+            except LLMUnavailableError:
+                # Nothing is stored, so the next --queue run retries the AI step.
+                self.job_queue.release(job["id"])
+                raise
+            self.job_queue.mark_summarized(job["id"], subject, minutes)
+            job = self.job_queue.get(job["id"])
+        result["subject"] = job["subject"]
+
+        if self.dry_run:
+            self.job_queue.release(job["id"])
+            result["status"] = "dry_run"
+            return result
+
+        self.job_queue.mark_previewed(job["id"])
+        with self._smtp_slots:
+            sent = send_job(self.job_queue, self.job_queue.get(job["id"]))
+        if sent:
+            result["status"] = "sent"
+        else:
+            result["error"] = self.job_queue.get(job["id"])["error"] or "Not sent."
+        return result
+
+    def run(self, files, workers=4):
+        """Dispatches files concurrently; results keep the input order."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+            return list(executor.map(self.dispatch_file, files))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dispatch a directory of meeting minutes without the GUI.")
+    parser.add_argument("target", help="Directory of minutes files, or a glob pattern such as 'notes/*.txt'.")
+    parser.add_argument("--workers", type=int, default=4, help="Meetings processed concurrently (default: 4).")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Maximum in-flight LLM dispatches (default: 4).")
+    parser.add_argument("--smtp-concurrency", type=int, default=2, help="Maximum in-flight SMTP sends (default: 2).")
+    parser.add_argument("--cc", default="", help="Comma-separated recipients added to every meeting.")
+    parser.add_argument("--summary", default="batch_summary.json", help="Where to write the JSON summary.")
+    parser.add_argument("--metrics-prom", help="Also write a Prometheus text-format metrics file here.")
+    parser.add_argument("--queue", nargs="?", const=BATCH_QUEUE_PATH,
+                        help="Record jobs in a durable queue (default path if no value) so reruns resume "
+                             "unfinished work and never send the same minutes twice.")
+    parser.add_argument("--dry-run", action="store_true", help="Run the LLM steps but do not send any email.")
+    args = parser.parse_args(argv)
+
+    files = find_minutes_files(args.target)
+    if not files:
+        print(f"❌ No minutes files found for '{args.target}'.")
+        return 1
+
+    job_queue = None
+    if args.queue:
+        job_queue = JobQueue(args.queue)
+        # Finish auto-approved jobs a previous (crashed) run left behind.
+        JobWorkerPool(job_queue, workers=args.workers).drain()
+
+    print(f"Dispatching {len(files)} meeting(s) with {args.workers} worker(s)...")
+    dispatcher = BatchDispatcher(
+        llm_concurrency=args.llm_concurrency,
+        smtp_concurrency=args.smtp_concurrency,
+        additional_emails_str=args.cc,
+        dry_run=args.dry_run,
+        job_queue=job_queue,
+    )
+    started = time.perf_counter()
+    results = dispatcher.run(files, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        marker = {"sent": "✅", "dry_run": "✅", "skipped": "⚠️", "already_sent": "⚠️", "partial": "⚠️"}.get(result["status"], "❌")
+        print(f"{marker} {os.path.basename(result['file'])}: {result['status']}" + (f" ({result['error']})" if result["error"] else ""))
+
+    summary = {
+        "total": len(results),
+        "counts": counts,
+        "seconds": round(elapsed, 3),
+        "llm_cache": get_cache_stats(),
+        "llm_state": get_resilience_state(),
+        "metrics": metrics.summary(),
+        "results": results,
+    }
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+    print(f"--- Batch complete in {elapsed:.1f}s: {counts}. Summary written to {args.summary} ---")
+    return 0 if counts.get("failed", 0) == 0 and counts.get("partial", 0) == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Benchmark harness for the dispatch pipeline. Needs no Gemini key, Gmail
+account or network: a fake genai client stands in for the API and a local
+SMTP sink accepts the mail.
+
+    python bench_dispatch.py
+    python bench_dispatch.py --llm-latency 0.8 --iterations 20 --json bench.json
+
+Reports throughput for clean_text, extract_emails and clean_and_extract over
+synthetic minutes of 1 KB to 5 MB, latency for single and batch dispatches,
+and the time to bulk-send to a large recipient list.
+"""
+import os
+
+# Dummy credentials, a cold, unthrottled LLM layer and no DNS lookups, set before agent_core reads them.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SENDER_EMAIL", "dispatcher@example.com")
+os.environ.setdefault("GMAIL_PASSWORD", "benchmark")
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ.setdefault("LLM_RPM_PRO", "1000000")
+os.environ.setdefault("LLM_RPM_FLASH", "1000000")
+os.environ.setdefault("RECIPIENT_CHECK_DOMAINS", "0")
+
+import argparse
+import json
+import random
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import agent_core
+import llm_service
+from batch_dispatch import BatchDispatcher
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+
+
+# --- Fake Gemini Client ---
+
+class FakeGenaiClient:
+    """
+    Mimics the parts of genai.Client used by llm_service. Each call sleeps for
+    `latency` seconds (plus optional jitter) and returns `output_words` words.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, output_words=300, stream_chunks=10):
+        self.latency = latency
+        self.jitter = jitter
+        self.output_words = output_words
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.models = self
+
+    def _delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _response(self, contents, text):
+        usage = types.SimpleNamespace(
+            prompt_token_count=len(contents) // 4,
+            candidates_token_count=len(text) // 4,
+            thoughts_token_count=0,
+            total_token_count=(len(contents) + len(text)) // 4,
+        )
+        return types.SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _text(self, model, contents, config=None):
+        minutes = "Meeting Details\n\n" + " ".join("minutes" for _ in range(self.output_words))
+        schema = (config or {}).get("response_schema")
+        if schema and "sections" in schema["properties"]:
+            return json.dumps({"sections": [{"heading": "Action Items", "text": "    - Alice: send budget"}]})
+        if schema:
+            return json.dumps({"subject": "Weekly Project Sync", "minutes": minutes,
+                               "action_items": [{"task": "Send budget", "owner": "Alice", "due": "Friday"}],
+                               "attendees": ["Alice", "Bob"]})
+        if "email subject title" in contents:
+            return "Weekly Project Sync"
+        return minutes
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self._delay())
+        return self._response(contents, self._text(model, contents, config))
+
+    def generate_content_stream(self, model, contents, config=None):
+        with self._lock:
+            self.calls += 1
+        text = self._text(model, contents, config)
+        step = max(1, len(text) // self.stream_chunks)
+        pause = self._delay() / self.stream_chunks
+        for i in range(0, len(text), step):
+            time.sleep(pause)
+            yield self._response(contents, text[i:i + step])
+
+
+# --- Local SMTP Sink ---
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP to accept and discard messages. Subclasses can
+    override reply_to() and data_reply() to script refusals or drop the
+    connection.
+    """
+
+    def _reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def reply_to(self, command):
+        """Reply line for HELO, MAIL, RCPT, RSET or NOOP; None drops the connection."""
+        return "250 OK"
+
+    def data_reply(self):
+        """Reply line once a message's data has been received."""
+        return "250 OK"
+
+    def handle(self):
+        self._reply("220 localhost bench sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-localhost\r\n250 SIZE 52428800\r\n")
+            elif command.startswith("DATA"):
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.messages += 1
+                self._reply(self.data_reply())
+            elif command.startswith("QUIT"):
+                self._reply("221 Bye")
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                if command.startswith("RCPT"):
+                    self.server.recipients += 1
+                reply = self.reply_to(command)
+                if reply is None:
+                    return
+                self._reply(reply)
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded SMTP sink on 127.0.0.1; counts messages and recipients."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, handler=_SMTPSinkHandler):
+        super().__init__(("127.0.0.1", port), handler)
+        self.messages = 0
+        self.recipients = 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+# --- Synthetic Minutes ---
+
+_NAMES = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy"]
+_WORDS = ("agreed to follow up on the budget review and timeline for the launch "
+          "discussion covered hiring roadmap risks blockers owners due dates").split()
+
+
+def synthetic_minutes(size, emails_every=40, seed=0):
+    """Generates roughly `size` characters of meeting notes with embedded emails and odd whitespace."""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    count = 0
+    while length < size:
+        count += 1
+        if count % emails_every == 0:
+            token = f"{rng.choice(_NAMES)}{rng.randint(1, 500)}@example{rng.randint(1, 20)}.com"
+        else:
+            token = rng.choice(_WORDS)
+        separator = rng.choice([" ", " ", " ", "\n", " ", "\t", "  "])
+        parts.append(token + separator)
+        length += len(token) + 1
+    return "".join(parts)[:size]
+
+
+# --- Benchmarks ---
+
+def _time_per_call(func, arg, min_seconds=0.2):
+    """Runs func(arg) repeatedly for at least min_seconds; returns seconds per call."""
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        func(arg)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / runs
+
+
+def bench_text(sizes=SIZES):
+    """Throughput of clean_text, extract_emails and the single-pass scanner per input size."""
+    results = []
+    for size in sizes:
+        text = synthetic_minutes(size)
+        cleaned = agent_core.clean_text(text)
+        for name, func, arg in (("clean_text", agent_core.clean_text, text),
+                                ("extract_emails", agent_core.extract_emails, cleaned),
+                                ("clean_and_extract", agent_core.clean_and_extract, text)):
+            per_call = _time_per_call(func, arg)
+            results.append({
+                "benchmark": name,
+                "size_bytes": size,
+                "ms_per_call": round(per_call * 1000, 3),
+                "mb_per_s": round(size / per_call / 1e6, 2),
+            })
+    return results
+
+
+def _latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * (len(samples) - 1) + 0.5))] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+    }
+
+
+def bench_single_dispatch(iterations=10, size=10_000):
+    """End-to-end latency: clean, extract, both LLM calls and one SMTP send."""
+    samples = []
+    for i in range(iterations):
+        raw = synthetic_minutes(size, seed=i)
+        started = time.perf_counter()
+        cleaned = agent_core.clean_text(raw)
+        extracted, _ = agent_core.collect_recipients(cleaned)
+        subject, minutes = agent_core.get_llm_subject_and_minutes(cleaned)
+        agent_core.send_email_collective(agent_core.SENDER_EMAIL, sorted(extracted), subject, minutes)
+        samples.append(time.perf_counter() - started)
+    return dict(benchmark="single_dispatch", size_bytes=size, **_latency_summary(samples))
+
+
+def bench_batch_dispatch(meetings=20, workers=8, size=10_000):
+    """Wall-clock throughput of BatchDispatcher over a directory of synthetic files."""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(meetings):
+            path = os.path.join(tmp, f"meeting_{i:03d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(synthetic_minutes(size, seed=1000 + i))
+            files.append(path)
+
+        dispatcher = BatchDispatcher(llm_concurrency=workers, smtp_concurrency=workers)
+        started = time.perf_counter()
+        results = dispatcher.run(files, workers=workers)
+        elapsed = time.perf_counter() - started
+
+    return dict(
+        benchmark="batch_dispatch",
+        meetings=meetings,
+        workers=workers,
+        sent=sum(1 for r in results if r["status"] == "sent"),
+        seconds=round(elapsed, 3),
+        meetings_per_s=round(meetings / elapsed, 2),
+        **_latency_summary([r["seconds"] for r in results]),
+    )
+
+
+def bench_bulk_send(recipients=500, batch_size=agent_core.SMTP_BATCH_SIZE):
+    """Wall-clock time to send one message to a large list in parallel bulk batches."""
+    addresses = [f"attendee{i}@example.com" for i in range(recipients)]
+    started = time.perf_counter()
+    report = agent_core.send_email_bulk(agent_core.SENDER_EMAIL, addresses, "All-hands minutes", "minutes",
+                                        batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "benchmark": "bulk_send",
+        "recipients": recipients,
+        "batches": report["batches"],
+        "delivered": len(report["delivered"]),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch pipeline against a fake LLM and local SMTP sink.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake Gemini call (default: 0.5).")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Uniform +/- jitter on the latency (default: 0.1).")
+    parser.add_argument("--output-words", type=int, default=300, help="Words in each fake minutes response.")
+    parser.add_argument("--iterations", type=int, default=10, help="Single-dispatch iterations (default: 10).")
+    parser.add_argument("--meetings", type=int, default=20, help="Meetings in the batch benchmark (default: 20).")
+    parser.add_argument("--workers", type=int, default=8, help="Batch workers (default: 8).")
+    parser.add_argument("--bulk-recipients", type=int, default=500, help="Recipients in the bulk-send benchmark (default: 500).")
+    parser.add_argument("--max-size", type=int, default=SIZES[-1], help="Largest synthetic input for text benchmarks.")
+    parser.add_argument("--json", help="Write all results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    fake = FakeGenaiClient(latency=args.llm_latency, jitter=args.llm_jitter, output_words=args.output_words)
+    llm_service.set_client(fake)
+    sink = SMTPSink().start()
+    agent_core.set_smtp_pool(agent_core.SMTPConnectionPool("127.0.0.1", sink.server_address[1], use_starttls=False))
+
+    results = []
+    print("--- Text processing ---")
+    for row in bench_text([s for s in SIZES if s <= args.max_size]):
+        print(f"{row['benchmark']:<18} {row['size_bytes']:>9} B  {row['ms_per_call']:>10.3f} ms  {row['mb_per_s']:>8.2f} MB/s")
+        results.append(row)
+
+    print("--- Dispatch (fake LLM latency %.2fs) ---" % args.llm_latency)
+    for row in (bench_single_dispatch(args.iterations), bench_batch_dispatch(args.meetings, args.workers),
+                bench_bulk_send(args.bulk_recipients)):
+        print(json.dumps(row))
+        results.append(row)
+
+    print(f"LLM calls: {fake.calls}, SMTP messages: {sink.messages}, recipients: {sink.recipients}")
+    sink.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
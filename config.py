@@ -0,0 +1,19 @@
+"""
+Process-wide configuration loading. Both agent_core and llm_service call
+load_config() before reading os.environ, but the .env file is only parsed once.
+"""
+import threading
+
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_config():
+    """Loads .env into os.environ on the first call; later calls are no-ops."""
+    global _loaded
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
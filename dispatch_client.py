@@ -0,0 +1,211 @@
+"""
+Client for the team dispatch service (dispatch_server.py).
+
+DispatchClient wraps the HTTP endpoints. RemoteDispatchEngine has the same
+interface as DispatchEngine (an `events` queue plus submit/send/cancel), so
+the GUI runs as a thin client when DISPATCH_SERVICE_URL is set: the server
+does the AI and SMTP work and no Gemini or Gmail credentials are needed
+locally. Only the standard library and ingest.py are used here.
+"""
+import itertools
+import json
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+from config import load_config
+from dispatch_events import DispatchEvent, EVENT_LOG, EVENT_DRAFT, EVENT_SENT, EVENT_FAILED
+from ingest import read_file_content
+
+load_config()
+
+DISPATCH_SERVICE_URL = os.getenv("DISPATCH_SERVICE_URL")
+DISPATCH_SERVICE_TOKEN = os.getenv("DISPATCH_SERVICE_TOKEN")
+CLIENT_TIMEOUT = float(os.getenv("DISPATCH_CLIENT_TIMEOUT", "30"))  # seconds per request
+POLL_INTERVAL = 0.5  # seconds between status polls while dispatches are in flight
+
+
+class DispatchServiceError(Exception):
+    """The service answered with an error status or could not be reached."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class DispatchClient:
+    """Thin JSON-over-HTTP client for one dispatch service."""
+
+    def __init__(self, base_url=DISPATCH_SERVICE_URL, token=DISPATCH_SERVICE_TOKEN, timeout=CLIENT_TIMEOUT):
+        if not base_url:
+            raise ValueError("No dispatch service URL given (set DISPATCH_SERVICE_URL).")
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header("Accept", "application/json")
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read().decode("utf-8")
+                if response.headers.get_content_type() != "application/json":
+                    return body
+                return json.loads(body)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            retry_after = e.headers.get("Retry-After")
+            raise DispatchServiceError(f"{e.code}: {message}", status=e.code,
+                                       retry_after=float(retry_after) if retry_after else None)
+        except (urllib.error.URLError, OSError) as e:
+            raise DispatchServiceError(f"Dispatch service at {self.base_url} unreachable: {e}")
+
+    def submit(self, minutes, cc="", auto_send=False):
+        """Submits raw minutes; returns the new dispatch's status (with its 'id')."""
+        return self._request("POST", "/dispatches", {"minutes": minutes, "cc": cc, "auto_send": auto_send})
+
+    def get(self, dispatch_id):
+        return self._request("GET", f"/dispatches/{dispatch_id}")
+
+    def send(self, dispatch_id):
+        return self._request("POST", f"/dispatches/{dispatch_id}/send")
+
+    def cancel(self, dispatch_id):
+        return self._request("POST", f"/dispatches/{dispatch_id}/cancel")
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def metrics(self):
+        return self._request("GET", "/metrics")
+
+
+class RemoteDispatchEngine:
+    """
+    DispatchEngine stand-in backed by a DispatchClient. A single poller
+    thread turns server-side status changes into the usual DispatchEvents.
+    """
+
+    def __init__(self, client=None, poll_interval=POLL_INTERVAL):
+        self.client = client or DispatchClient()
+        self.poll_interval = poll_interval
+        self.events = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = {}  # local job id -> {"remote_id", "log_seen", "state"}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._poller = threading.Thread(target=self._poll, name="dispatch-poll", daemon=True)
+        self._poller.start()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def submit(self, raw_minutes, additional_emails_str=""):
+        job_id = next(self._job_ids)
+        threading.Thread(target=self._run_submit, args=(job_id, raw_minutes, additional_emails_str),
+                         daemon=True).start()
+        return job_id
+
+    def send(self, job_id, draft):
+        threading.Thread(target=self._run_send, args=(job_id,), daemon=True).start()
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None and job["remote_id"] is not None:
+            try:
+                self.client.cancel(job["remote_id"])
+            except DispatchServiceError as e:
+                print(f"⚠️ Could not cancel dispatch {job['remote_id']} on the service: {e}")
+
+    def resume(self):
+        """Unfinished dispatches are resumed by the service itself."""
+        return 0
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+
+    # --- Background helpers ---
+
+    def _emit(self, job_id, kind, data=None):
+        self.events.put(DispatchEvent(job_id, kind, data))
+
+    def _run_submit(self, job_id, raw_minutes, additional_emails_str):
+        self._emit(job_id, EVENT_LOG, "Submitting minutes to the dispatch service...")
+        try:
+            status = self.client.submit(raw_minutes, additional_emails_str)
+        except DispatchServiceError as e:
+            hint = f" Try again in {e.retry_after:.0f}s." if e.retry_after else ""
+            self._emit(job_id, EVENT_FAILED, f"❌ Dispatch failed: {e}{hint}")
+            return
+        with self._lock:
+            self._jobs[job_id] = {"remote_id": status["id"], "log_seen": 0, "state": status["state"]}
+        self._wake.set()
+
+    def _run_send(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            self._emit(job_id, EVENT_SENT, False)
+            return
+        try:
+            self.client.send(job["remote_id"])
+        except DispatchServiceError as e:
+            print(f"❌ Failed to send collective email: {e}")
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            self._emit(job_id, EVENT_SENT, False)
+            return
+        with self._lock:
+            job["state"] = "sending"
+        self._wake.set()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            with self._lock:
+                jobs = [(job_id, job) for job_id, job in self._jobs.items() if job["state"] != "ready"]
+            for job_id, job in jobs:
+                try:
+                    self._update(job_id, job, self.client.get(job["remote_id"]))
+                except DispatchServiceError as e:
+                    print(f"⚠️ Could not poll dispatch {job['remote_id']}: {e}")
+            self._wake.wait(self.poll_interval if jobs else None)
+            self._wake.clear()
+
+    def _update(self, job_id, job, status):
+        # The server keeps only the latest log lines, so count from the end.
+        unseen = min(status.get("log_total", 0) - job["log_seen"], len(status.get("log", [])))
+        for message in status["log"][-unseen:] if unseen > 0 else []:
+            self._emit(job_id, EVENT_LOG, message)
+        job["log_seen"] = status.get("log_total", 0)
+
+        state = status["state"]
+        if state == job["state"]:
+            return
+        job["state"] = state
+        if state == "ready":
+            self._emit(job_id, EVENT_DRAFT, status["draft"])
+        elif state in ("sent", "failed", "cancelled"):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            if state == "sent":
+                self._emit(job_id, EVENT_SENT, True)
+            elif status.get("draft") is not None:
+                self._emit(job_id, EVENT_SENT, False)
+            elif state == "failed":
+                self._emit(job_id, EVENT_FAILED, status.get("error") or "❌ Dispatch failed on the service.")
+
@@ -0,0 +1,237 @@
+"""
+Background dispatch engine.
+
+Runs the clean -> extract -> LLM -> SMTP pipeline on worker threads and
+reports progress through a thread-safe event queue. The GUI drains the queue
+from the Tk event loop, so it never blocks on a network round-trip and more
+than one dispatch can be in flight at once.
+"""
+import concurrent.futures
+import itertools
+import queue
+import threading
+import time
+
+import metrics
+from job_queue import STATE_INGESTED, STATE_SUMMARIZED, STATE_PREVIEWED, STATE_SENDING, STATE_SENT, send_job
+
+from agent_core import (
+    clean_and_extract,
+    format_email_body,
+    parse_manual_recipients,
+    resolve_recipients,
+    send_email_collective,
+    SENDER_EMAIL,
+    LLMUnavailableError,
+    get_llm_subject_and_minutes,
+    stream_llm_subject_and_minutes
+)
+from dispatch_events import (
+    DispatchEvent,
+    EVENT_LOG,
+    EVENT_DRAFT_STARTED,
+    EVENT_SUBJECT,
+    EVENT_CHUNK,
+    EVENT_DRAFT,
+    EVENT_SENT,
+    EVENT_FAILED
+)
+
+
+class DispatchEngine:
+    """
+    Worker pool that prepares drafts and sends them, posting DispatchEvents.
+    With stream_minutes=True the minutes arrive as chunk events before the
+    final draft event, so a preview can render them incrementally. With a
+    job_queue (see job_queue.py) every draft is persisted: LLM output
+    survives a crash, resume() brings unfinished drafts back, and the same
+    minutes are never sent twice to the same recipients. With a
+    RevisionStore (revisions.py), notes re-dispatched after a small edit
+    only have the changed sections of the earlier minutes regenerated; give
+    each interactive session its own store.
+    """
+
+    def __init__(self, max_workers=2, stream_minutes=False, job_queue=None, revisions=None):
+        self.stream_minutes = stream_minutes
+        self.job_queue = job_queue
+        self.revisions = revisions
+        self._queue_ids = {}  # engine job id -> persistent queue job id
+        self.events = queue.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dispatch")
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._in_flight = set()
+
+    def in_flight(self):
+        """Number of jobs submitted but not yet sent, cancelled or failed."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def submit(self, raw_minutes, additional_emails_str=""):
+        """Queues a new dispatch. Returns its job id; a draft event follows."""
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._in_flight.add(job_id)
+        self._executor.submit(self._run_prepare, job_id, raw_minutes, additional_emails_str)
+        return job_id
+
+    def send(self, job_id, draft):
+        """Sends a previously prepared draft in the background."""
+        self._executor.submit(self._run_send, job_id, draft)
+
+    def cancel(self, job_id):
+        """Marks a job as finished without sending it."""
+        queue_id = self._queue_ids.pop(job_id, None)
+        if queue_id is not None:
+            self.job_queue.mark_cancelled(queue_id)
+        self._finish(job_id)
+
+    def resume(self):
+        """
+        Re-posts drafts left unfinished by an earlier run (from the job queue)
+        and re-runs the AI step for jobs that never got that far. Returns the
+        number of jobs resumed.
+        """
+        if self.job_queue is None:
+            return 0
+        recovered = self.job_queue.recover_interrupted()
+        if recovered:
+            print(f"⚠️ {recovered} earlier dispatch(es) were interrupted while sending; check the mailbox before re-sending.")
+
+        queued_jobs = [job for job in self.job_queue.jobs_in((STATE_INGESTED, STATE_SUMMARIZED, STATE_PREVIEWED))
+                       if not job["auto_approve"]]
+        for queue_job in queued_jobs:
+            job_id = next(self._job_ids)
+            with self._lock:
+                self._in_flight.add(job_id)
+            self._queue_ids[job_id] = queue_job["id"]
+            if queue_job["minutes"] is not None:
+                self._emit_stored_draft(job_id, queue_job)
+            else:
+                self._executor.submit(self._run_summarize, job_id, queue_job["cleaned_text"],
+                                      queue_job["to_email"], queue_job["cc"], queue_job["id"], time.perf_counter())
+        return len(queued_jobs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    # --- Worker-side helpers ---
+
+    def _emit(self, job_id, kind, data=None):
+        self.events.put(DispatchEvent(job_id, kind, data))
+
+    def _log(self, job_id, message):
+        self._emit(job_id, EVENT_LOG, message)
+
+    def _finish(self, job_id):
+        with self._lock:
+            self._in_flight.discard(job_id)
+
+    def _run_prepare(self, job_id, raw_minutes, additional_emails_str):
+        started = time.perf_counter()
+        try:
+            # Get emails from both sources
+            cleaned_minutes, extracted = clean_and_extract(raw_minutes)
+            manual_emails = parse_manual_recipients(additional_emails_str)
+            if extracted:
+                self._log(job_id, f"Found {len(extracted)} recipient(s) in minutes text.")
+            if manual_emails:
+                self._log(job_id, f"Found {len(manual_emails)} manually added recipient(s).")
+
+            primary_to_email = SENDER_EMAIL
+            cc_recipients, rejected = resolve_recipients(extracted, additional_emails_str, exclude=[primary_to_email])
+            for entry, reason in rejected.items():
+                self._log(job_id, f"⚠️ Skipping {entry}: {reason}.")
+            self._log(job_id, f"Total unique recipients: {len(cc_recipients)}")
+
+            if not cc_recipients:
+                self._finish(job_id)
+                self._emit(job_id, EVENT_FAILED, "⚠️ No valid email addresses provided in the minutes or the recipients field.")
+                return
+
+            queue_id = None
+            if self.job_queue is not None:
+                queue_job = self.job_queue.enqueue(cleaned_minutes, primary_to_email, cc_recipients, lease=True)
+                queue_id = queue_job["id"]
+                if queue_job["state"] in (STATE_SENDING, STATE_SENT):
+                    self._finish(job_id)
+                    self._emit(job_id, EVENT_FAILED, f"⚠️ These minutes were already sent to the same recipients (job {queue_id}); not sending again.")
+                    return
+                self._queue_ids[job_id] = queue_id
+                if queue_job["minutes"] is not None:
+                    self._log(job_id, f"Reusing saved AI output from job {queue_id}.")
+                    self._emit_stored_draft(job_id, queue_job)
+                    return
+
+            self._run_summarize(job_id, cleaned_minutes, primary_to_email, cc_recipients, queue_id, started)
+        except Exception as e:
+            self._finish(job_id)
+            self._emit(job_id, EVENT_FAILED, f"❌ Dispatch failed: {type(e).__name__}: {e}")
+
+    def _emit_stored_draft(self, job_id, queue_job):
+        self._emit(job_id, EVENT_DRAFT, {
+            "subject": queue_job["subject"],
+            "minutes": queue_job["minutes"],
+            "body": format_email_body(queue_job["minutes"]),
+            "to": queue_job["to_email"],
+            "cc": queue_job["cc"],
+            "queue_id": queue_job["id"],
+        })
+
+    def _run_summarize(self, job_id, cleaned_minutes, primary_to_email, cc_recipients, queue_id, started):
+        try:
+            self._log(job_id, "Requesting AI to generate subject and reformat minutes...")
+            if self.stream_minutes:
+                self._emit(job_id, EVENT_DRAFT_STARTED, {"to": primary_to_email, "cc": cc_recipients})
+                meeting_subject, parts = None, []
+                for kind, value in stream_llm_subject_and_minutes(
+                        cleaned_minutes, fallback=False, revisions=self.revisions):
+                    if kind == "subject":
+                        meeting_subject = value
+                        self._emit(job_id, EVENT_SUBJECT, value)
+                    else:
+                        parts.append(value)
+                        self._emit(job_id, EVENT_CHUNK, value)
+                detailed_description = "".join(parts).strip()
+            else:
+                meeting_subject, detailed_description = get_llm_subject_and_minutes(
+                    cleaned_minutes, fallback=False, revisions=self.revisions)
+            self._log(job_id, "AI generation complete.")
+            if queue_id is not None:
+                self.job_queue.mark_summarized(queue_id, meeting_subject, detailed_description)
+
+            metrics.record("dispatch.prepare", time.perf_counter() - started, streaming=str(self.stream_minutes).lower())
+            self._emit(job_id, EVENT_DRAFT, {
+                "subject": meeting_subject,
+                "minutes": detailed_description,
+                "body": format_email_body(detailed_description),
+                "to": primary_to_email,
+                "cc": cc_recipients,
+                "queue_id": queue_id,
+            })
+        except Exception as e:
+            if queue_id is not None:
+                self._queue_ids.pop(job_id, None)
+                self.job_queue.release(queue_id)
+            self._finish(job_id)
+            if isinstance(e, LLMUnavailableError):
+                # Nothing was stored, so dispatching the same notes again retries the AI step.
+                self._emit(job_id, EVENT_FAILED, f"❌ AI generation failed ({e}); no draft was saved. Please try again.")
+            else:
+                self._emit(job_id, EVENT_FAILED, f"❌ Dispatch failed: {type(e).__name__}: {e}")
+
+    def _run_send(self, job_id, draft):
+        queue_id = draft.get("queue_id")
+        try:
+            with metrics.stage("dispatch.send"):
+                if queue_id is not None:
+                    self.job_queue.mark_previewed(queue_id)
+                    ok = send_job(self.job_queue, self.job_queue.get(queue_id))
+                else:
+                    ok = send_email_collective(draft["to"], draft["cc"], draft["subject"], draft["body"])
+        except Exception as e:
+            print(f"❌ Failed to send collective email: {e}")
+            ok = False
+        self._queue_ids.pop(job_id, None)
+        self._finish(job_id)
+        self._emit(job_id, EVENT_SENT, ok)
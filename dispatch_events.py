@@ -0,0 +1,16 @@
+"""
+Dispatch events shared by the local engine (dispatch_engine.py) and the
+service client (dispatch_client.py). Kept free of agent_core imports so a
+thin client can use them without Gemini or SMTP credentials.
+"""
+import collections
+
+DispatchEvent = collections.namedtuple("DispatchEvent", ["job_id", "kind", "data"])
+
+EVENT_LOG = "log"        # data: message string
+EVENT_DRAFT_STARTED = "draft_started"  # data: dict with to, cc (streaming only)
+EVENT_SUBJECT = "subject"  # data: subject string (streaming only)
+EVENT_CHUNK = "chunk"    # data: next piece of the minutes text (streaming only)
+EVENT_DRAFT = "draft"    # data: dict with subject, minutes, body, to, cc (and queue_id with a job queue)
+EVENT_SENT = "sent"      # data: True if SMTP accepted the message
+EVENT_FAILED = "failed"  # data: message string; the job is finished
@@ -0,0 +1,377 @@
+"""
+Team dispatch service: one host holds the Gemini client, LLM cache, SMTP
+connection pool and job queue, and everyone's dispatches share them.
+
+    python dispatch_server.py --host 0.0.0.0 --port 8765 --workers 4
+    DISPATCH_SERVICE_URL=http://dispatch-host:8765 python gui_app.py
+
+A small asyncio HTTP/1.1 server (stdlib only) in front of DispatchEngine.
+Requests are handled on the event loop; the LLM and SMTP work runs on the
+engine's worker threads. JSON endpoints:
+
+    POST /dispatches                {"minutes": "...", "cc": "a@x.com, b@y.com", "auto_send": false}
+                                    -> 202 {"id": 7, "state": "preparing"}
+    GET  /dispatches/<id>           state, log lines and, once ready, the draft
+    POST /dispatches/<id>/send      sends the previewed draft -> 202
+    POST /dispatches/<id>/cancel
+    GET  /health                    load, LLM cache and circuit breaker state
+    GET  /metrics                   Prometheus text format
+
+When SERVICE_MAX_PENDING dispatches are being prepared or sent, new
+submissions get 503 with a Retry-After header instead of queueing without
+bound. Drafts nobody sends or cancels within DISPATCH_SERVICE_READY_TTL
+seconds are cancelled. Set DISPATCH_SERVICE_TOKEN to require "Authorization: Bearer <token>".
+"""
+import argparse
+import asyncio
+import collections
+import hmac
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from agent_core import warm_up_services
+from dispatch_engine import (
+    DispatchEngine,
+    EVENT_LOG,
+    EVENT_DRAFT,
+    EVENT_SENT,
+    EVENT_FAILED
+)
+from job_queue import open_default_queue, SERVICE_QUEUE_PATH
+from llm_service import get_cache_stats, get_resilience_state
+import metrics
+
+SERVICE_HOST = os.getenv("DISPATCH_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("DISPATCH_SERVICE_PORT", "8765"))
+SERVICE_TOKEN = os.getenv("DISPATCH_SERVICE_TOKEN")
+SERVICE_WORKERS = int(os.getenv("DISPATCH_SERVICE_WORKERS", "4"))
+SERVICE_MAX_PENDING = int(os.getenv("DISPATCH_SERVICE_MAX_PENDING", "32"))  # preparing + sending
+SERVICE_MAX_RECORDS = 1000      # finished dispatches kept for status queries
+SERVICE_READY_TTL = float(os.getenv("DISPATCH_SERVICE_READY_TTL", "86400"))  # seconds an unsent draft is kept
+MAX_REQUEST_BYTES = 20 * 1024 * 1024
+MAX_LOG_LINES_PER_JOB = 200
+KEEP_ALIVE_TIMEOUT = 30         # seconds an idle connection is kept open
+RETRY_AFTER_SECONDS = 5
+
+STATE_PREPARING = "preparing"
+STATE_READY = "ready"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+BUSY_STATES = (STATE_PREPARING, STATE_SENDING)
+FINISHED_STATES = (STATE_SENT, STATE_FAILED, STATE_CANCELLED)
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """Turned into a JSON error response with the given status."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class DispatchService:
+    """
+    Tracks dispatches submitted over HTTP. Engine events are pumped from a
+    background thread onto the event loop, so all record updates happen on
+    the loop and need no locking.
+    """
+
+    def __init__(self, engine, max_pending=SERVICE_MAX_PENDING, token=SERVICE_TOKEN):
+        self.engine = engine
+        self.max_pending = max_pending
+        self.token = token
+        self._records = collections.OrderedDict()  # engine job id -> record
+        self._loop = None
+        self._stop = threading.Event()
+
+    # --- Engine events ---
+
+    def start(self, loop):
+        self._loop = loop
+        threading.Thread(target=self._pump_events, name="dispatch-events", daemon=True).start()
+        self._loop.call_later(min(SERVICE_READY_TTL, 60), self._sweep)
+        resumed = self.engine.resume()
+        if resumed:
+            print(f"Resuming {resumed} unfinished dispatch(es) from the job queue.")
+
+    def stop(self):
+        self._stop.set()
+
+    def _pump_events(self):
+        while not self._stop.is_set():
+            try:
+                event = self.engine.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._loop.call_soon_threadsafe(self._apply_event, event)
+
+    def _record(self, job_id, **fields):
+        record = self._records.get(job_id)
+        if record is None:
+            # Jobs resumed from the queue at start-up appear here first.
+            record = {"id": job_id, "state": STATE_PREPARING, "auto_send": False, "log": [], "log_total": 0,
+                      "draft": None, "error": None, "created_at": time.time()}
+            self._records[job_id] = record
+        record.update(fields, updated_at=time.time())
+        return record
+
+    def _apply_event(self, event):
+        record = self._records.get(event.job_id)
+        if record is not None and record["state"] == STATE_CANCELLED and event.kind != EVENT_LOG:
+            return  # the worker finished after the user cancelled
+        if event.kind == EVENT_LOG:
+            record = self._record(event.job_id)
+            record["log"].append(event.data)
+            record["log_total"] += 1
+            del record["log"][:-MAX_LOG_LINES_PER_JOB]
+        elif event.kind == EVENT_DRAFT:
+            record = self._record(event.job_id, state=STATE_READY, draft=event.data)
+            if record["auto_send"]:
+                self._send(record)
+        elif event.kind == EVENT_FAILED:
+            self._record(event.job_id, state=STATE_FAILED, error=event.data)
+        elif event.kind == EVENT_SENT:
+            self._record(event.job_id, state=STATE_SENT if event.data else STATE_FAILED,
+                         error=None if event.data else "SMTP send failed.")
+        self._evict()
+
+    def _sweep(self):
+        if self._stop.is_set():
+            return
+        self._evict()
+        self._loop.call_later(min(SERVICE_READY_TTL, 60), self._sweep)
+
+    def _expire_ready(self):
+        """Cancels drafts left unsent past SERVICE_READY_TTL, releasing their queue jobs."""
+        cutoff = time.time() - SERVICE_READY_TTL
+        for record in self._records.values():
+            if record["state"] == STATE_READY and record["updated_at"] < cutoff:
+                self.engine.cancel(record["id"])
+                record.update(state=STATE_CANCELLED, updated_at=time.time(),
+                              error=f"Draft expired after {SERVICE_READY_TTL:.0f}s without being sent.")
+
+    def _evict(self):
+        self._expire_ready()
+        finished = len(self._records) - SERVICE_MAX_RECORDS
+        if finished <= 0:
+            return
+        for job_id in [j for j, r in self._records.items() if r["state"] in FINISHED_STATES][:finished]:
+            del self._records[job_id]
+
+    # --- Operations ---
+
+    def pending(self):
+        return sum(1 for record in self._records.values() if record["state"] in BUSY_STATES)
+
+    def submit(self, payload):
+        minutes = payload.get("minutes")
+        if not isinstance(minutes, str) or not minutes.strip():
+            raise HTTPError(400, "Field 'minutes' must be a non-empty string.")
+        cc = payload.get("cc", "")
+        if isinstance(cc, list):
+            cc = ", ".join(str(address) for address in cc)
+        if not isinstance(cc, str):
+            raise HTTPError(400, "Field 'cc' must be a string or a list of addresses.")
+        if self.pending() >= self.max_pending:
+            raise HTTPError(503, f"Dispatch queue is full ({self.max_pending} in progress); retry shortly.",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        job_id = self.engine.submit(minutes, cc)
+        record = self._record(job_id, auto_send=bool(payload.get("auto_send")))
+        return 202, self._view(record)
+
+    def get(self, job_id):
+        record = self._records.get(job_id)
+        if record is None:
+            raise HTTPError(404, f"No dispatch with id {job_id}.")
+        return record
+
+    def _send(self, record):
+        record.update(state=STATE_SENDING, updated_at=time.time())
+        self.engine.send(record["id"], record["draft"])
+
+    def send(self, job_id):
+        record = self.get(job_id)
+        if record["state"] != STATE_READY:
+            raise HTTPError(409, f"Dispatch {job_id} is {record['state']}, not ready to send.")
+        self._send(record)
+        return 202, self._view(record)
+
+    def cancel(self, job_id):
+        record = self.get(job_id)
+        if record["state"] in FINISHED_STATES or record["state"] == STATE_SENDING:
+            raise HTTPError(409, f"Dispatch {job_id} is already {record['state']}.")
+        self.engine.cancel(job_id)
+        record.update(state=STATE_CANCELLED, updated_at=time.time())
+        return 200, self._view(record)
+
+    def health(self):
+        counts = collections.Counter(record["state"] for record in self._records.values())
+        return 200, {
+            "status": "ok",
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "dispatches": dict(counts),
+            "llm_cache": get_cache_stats(),
+            "llm_state": get_resilience_state(),
+        }
+
+    @staticmethod
+    def _view(record):
+        view = {key: record[key] for key in ("id", "state", "error", "log", "log_total", "created_at", "updated_at")}
+        draft = record["draft"]
+        if draft is not None:
+            view["draft"] = {key: draft[key] for key in ("subject", "minutes", "body", "to", "cc")}
+        return view
+
+    # --- HTTP ---
+
+    def _authorized(self, authorization):
+        # Constant-time comparison, so response timing does not leak the token.
+        return hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {self.token}".encode("utf-8"))
+
+    def route(self, method, path, headers, body):
+        """Returns (status, payload) for a request; payload is a dict or, for /metrics, text."""
+        if self.token and not self._authorized(headers.get("authorization", "")):
+            raise HTTPError(401, "Missing or invalid bearer token.")
+
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return self.health()
+        if parts == ["metrics"] and method == "GET":
+            return 200, metrics.prometheus_text()
+        if parts == ["dispatches"] and method == "POST":
+            return self.submit(_parse_json(body))
+        if len(parts) in (2, 3) and parts[0] == "dispatches":
+            try:
+                job_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404, f"No dispatch with id {parts[1]}.")
+            action = parts[2] if len(parts) == 3 else None
+            if action is None and method == "GET":
+                return 200, self._view(self.get(job_id))
+            if action == "send" and method == "POST":
+                return self.send(job_id)
+            if action == "cancel" and method == "POST":
+                return self.cancel(job_id)
+            raise HTTPError(405, f"{method} is not supported here.")
+        raise HTTPError(404, f"Unknown path {path}.")
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one connection (with keep-alive)."""
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=KEEP_ALIVE_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length") or 0)
+                extra_headers = {}
+                if length > MAX_REQUEST_BYTES:
+                    status, payload = 413, {"error": f"Request body over {MAX_REQUEST_BYTES} bytes."}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        with metrics.stage("service.request", method=method):
+                            status, payload = self.route(method, target, headers, body)
+                    except HTTPError as e:
+                        status, payload, extra_headers = e.status, {"error": str(e)}, e.headers
+                    except Exception as e:
+                        print(f"❌ Dispatch service error: {type(e).__name__}: {e}")
+                        status, payload = 500, {"error": "Internal server error."}
+
+                writer.write(_response(status, payload, extra_headers, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def _parse_json(body):
+    try:
+        payload = json.loads(body.decode("utf-8") or "{}")
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPError(400, f"Request body is not valid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object.")
+    return payload
+
+
+def _response(status, payload, extra_headers, keep_alive):
+    if isinstance(payload, str):
+        content_type, data = "text/plain; version=0.0.4; charset=utf-8", payload.encode("utf-8")
+    else:
+        content_type, data = "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Internal Server Error')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(data)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+
+async def serve(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    """Runs the HTTP server until cancelled."""
+    service.start(asyncio.get_running_loop())
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"✅ Dispatch service listening on {addresses}")
+    sys.stdout.flush()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve meeting-minutes dispatch over HTTP for a whole team.")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"Interface to bind (default: {SERVICE_HOST}).")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"Port to listen on (default: {SERVICE_PORT}).")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS,
+                        help=f"Dispatches prepared or sent concurrently (default: {SERVICE_WORKERS}).")
+    parser.add_argument("--max-pending", type=int, default=SERVICE_MAX_PENDING,
+                        help=f"In-progress dispatches before new ones get 503 (default: {SERVICE_MAX_PENDING}).")
+    args = parser.parse_args(argv)
+
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not SERVICE_TOKEN:
+        print("⚠️ Listening beyond localhost without DISPATCH_SERVICE_TOKEN; anyone who can reach the port can send email.")
+    threading.Thread(target=warm_up_services, daemon=True).start()
+    engine = DispatchEngine(max_workers=args.workers, job_queue=open_default_queue(SERVICE_QUEUE_PATH))
+    service = DispatchService(engine, max_pending=args.max_pending)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("Dispatch service stopped.")
+    finally:
+        engine.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
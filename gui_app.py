@@ -8,30 +8,123 @@ import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox
 
 import re
-
-from agent_core import (
-    clean_text,
-    send_email_collective,
-    extract_emails,
-    read_file_content,
-    SENDER_EMAIL,
-    get_llm_generated_subject,
-    get_llm_reformatted_minutes
+import collections
+import queue
+import threading
+import logging
+import logging.handlers
+
+from config import load_config
+from dispatch_events import (
+    EVENT_LOG,
+    EVENT_DRAFT_STARTED,
+    EVENT_SUBJECT,
+    EVENT_CHUNK,
+    EVENT_DRAFT,
+    EVENT_SENT,
+    EVENT_FAILED
 )
 
-print("meeting-agent.py: agent_core imported. GUI initializing...")
+load_config()
+
+# With DISPATCH_SERVICE_URL set the GUI is a thin client of dispatch_server.py:
+# the service does the AI and SMTP work, so no local credentials are needed.
+DISPATCH_SERVICE_URL = os.getenv("DISPATCH_SERVICE_URL")
+
+if DISPATCH_SERVICE_URL:
+    from dispatch_client import RemoteDispatchEngine, read_file_content
+    print(f"meeting-agent.py: using dispatch service at {DISPATCH_SERVICE_URL}. GUI initializing...")
+else:
+    from agent_core import read_file_content, warm_up_services
+    from job_queue import open_default_queue
+    from dispatch_engine import DispatchEngine
+    from revisions import RevisionStore
+    print("meeting-agent.py: agent_core imported. GUI initializing...")
+
+
+# How often (ms) the Tk loop drains log output and dispatch events.
+POLL_INTERVAL_MS = 50
+# Delay (ms) after startup before warming up the LLM client in the background.
+WARM_UP_DELAY_MS = 500
+
+# Log output is applied to the widget in one batch per interval, and the widget keeps only
+# the newest LOG_MAX_LINES lines. The full log is mirrored to a rotating file
+# (set AGENT_LOG_PATH to an empty string to disable the mirror).
+LOG_FLUSH_INTERVAL_MS = 200
+LOG_MAX_LINES = int(os.getenv("AGENT_LOG_MAX_LINES", "5000"))
+AGENT_LOG_PATH = os.getenv("AGENT_LOG_PATH", os.path.join(os.path.expanduser("~"), ".meeting_dispatcher", "agent.log"))
+AGENT_LOG_MAX_BYTES = 5 * 1024 * 1024
+AGENT_LOG_BACKUPS = 3
+
+
+def _open_log_mirror(path):
+    """Returns a rotating file handler for path, or None if it is disabled or can't be opened."""
+    if not path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=AGENT_LOG_MAX_BYTES, backupCount=AGENT_LOG_BACKUPS, encoding="utf-8")
+    except OSError as e:
+        sys.__stdout__.write(f"⚠️ Log file mirror disabled ({e})\n")
+        return None
+    handler.terminator = ""  # batches already carry their own newlines
+    return handler
 
 
 # --- Text Redirector Class (for GUI logging) ---
 class TextRedirector(object):
-    def __init__(self, widget, tag="stdout"):
+    """
+    Collects writes from any thread; only the Tk thread touches the widget,
+    via drain(). Each drain inserts everything pending in one go, trims the
+    widget to max_lines and appends the same text to the rotating log file,
+    so the cost of a write stays flat however long the session runs.
+    """
+    def __init__(self, widget, tag="stdout", max_lines=LOG_MAX_LINES, log_path=AGENT_LOG_PATH):
         self.widget = widget
         self.tag = tag
+        self.max_lines = max_lines
+        self.has_output = False  # O(1) stand-in for "is the log empty?"
+        self._pending = collections.deque()
+        self._mirror = _open_log_mirror(log_path)
 
     def write(self, str_to_write):
-        # --- FIX: No longer need to change state ---
-        self.widget.insert(tk.END, str_to_write, (self.tag,))
-        self.widget.see(tk.END)
+        if str_to_write:
+            self._pending.append(str_to_write)
+            self.has_output = True
+
+    def drain(self):
+        chunks = []
+        while self._pending:
+            chunks.append(self._pending.popleft())
+        if not chunks:
+            return
+        text = "".join(chunks)
+        if self._mirror is not None:
+            self._mirror.emit(logging.makeLogRecord({"msg": text}))
+
+        # Lines that would be trimmed straight away are never inserted.
+        if text.count("\n") > self.max_lines:
+            text = "\n".join(text.split("\n")[-(self.max_lines + 1):])
+        follow = self.widget.yview()[1] >= 0.999  # don't yank the view if the user scrolled up
+        self.widget.insert(tk.END, text, (self.tag,))
+        excess = int(self.widget.index("end-1c").split(".")[0]) - self.max_lines
+        if excess > 0:
+            self.widget.delete("1.0", f"{excess + 1}.0")
+        if follow:
+            self.widget.see(tk.END)
+
+    def clear(self):
+        """Empties the widget (the file mirror keeps its history)."""
+        self.drain()
+        self.widget.delete(1.0, tk.END)
+        self.has_output = False
+
+    def close(self):
+        self.drain()
+        if self._mirror is not None:
+            self._mirror.close()
+            self._mirror = None
 
     def flush(self):
         pass
@@ -45,6 +138,20 @@ class MeetingDispatcherApp:
 
         self.preview_confirmed = False
 
+        # Dispatches run on worker threads; drafts wait here for the preview window.
+        # Minutes stream in, so a draft may still be growing while it is previewed.
+        if DISPATCH_SERVICE_URL:
+            self.engine = RemoteDispatchEngine()
+        else:
+            # Edits re-dispatched in this window reuse this window's earlier output only.
+            self.engine = DispatchEngine(stream_minutes=True, job_queue=open_default_queue(),
+                                         revisions=RevisionStore())
+        self._drafts = {}
+        self._pending_drafts = collections.deque()
+        self._cancelled_jobs = set()
+        self._preview_open = False
+        self._live_preview = None
+
         # --- Widgets ---
         file_frame = tk.Frame(master)
         file_frame.pack(pady=10)
@@ -119,12 +226,91 @@ class MeetingDispatcherApp:
         
         self.old_stdout = sys.stdout
         # The TextRedirector no longer needs to toggle the widget's state
-        sys.stdout = TextRedirector(self.log_text_widget, "stdout")
+        self.log_redirector = TextRedirector(self.log_text_widget, "stdout")
+        sys.stdout = self.log_redirector
+
+        self.master.after(POLL_INTERVAL_MS, self._poll_events)
+        self.master.after(LOG_FLUSH_INTERVAL_MS, self._flush_log)
+        self.master.protocol("WM_DELETE_WINDOW", self._on_close)
+        resumed = self.engine.resume()
+        if resumed:
+            self.log_message(f"Resuming {resumed} unfinished dispatch(es) from the last session.")
+        # Once the window is up, load the Gemini SDK and SMTP modules off the Tk thread.
+        if not DISPATCH_SERVICE_URL:
+            self.master.after(WARM_UP_DELAY_MS, lambda: threading.Thread(target=warm_up_services, daemon=True).start())
+
+    def _flush_log(self):
+        """Applies buffered log output to the widget on the Tk thread."""
+        self.master.after(LOG_FLUSH_INTERVAL_MS, self._flush_log)
+        self.log_redirector.drain()
+
+    def _on_close(self):
+        sys.stdout = self.old_stdout
+        self.log_redirector.close()
+        self.master.destroy()
+
+    def _poll_events(self):
+        """Drains dispatch events on the Tk thread."""
+        # Re-arm first: the preview window runs a nested loop that must keep polling.
+        self.master.after(POLL_INTERVAL_MS, self._poll_events)
+
+        while True:
+            try:
+                event = self.engine.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if event.kind == EVENT_LOG:
+                self.log_message(event.data)
+            elif event.kind == EVENT_FAILED:
+                self.log_message(event.data)
+                if event.job_id in self._drafts:
+                    self._drafts[event.job_id]["failed"] = True
+            elif event.kind == EVENT_DRAFT_STARTED:
+                self._drafts[event.job_id] = dict(event.data, subject=None, minutes="", complete=False)
+                self._handle_draft(event.job_id)
+            elif event.kind == EVENT_SUBJECT:
+                self._update_draft(event.job_id, subject=event.data)
+            elif event.kind == EVENT_CHUNK:
+                self._update_draft(event.job_id, chunk=event.data)
+            elif event.kind == EVENT_DRAFT:
+                if event.job_id in self._cancelled_jobs:
+                    self._cancelled_jobs.discard(event.job_id)
+                elif event.job_id in self._drafts:
+                    self._update_draft(event.job_id, final=event.data)
+                else:
+                    self._drafts[event.job_id] = dict(event.data, complete=True)
+                    self._handle_draft(event.job_id)
+            elif event.kind == EVENT_SENT:
+                self._handle_sent(event.data)
+
+    def _update_draft(self, job_id, subject=None, chunk=None, final=None):
+        """Applies streamed progress to a draft and to its preview, if open."""
+        draft = self._drafts.get(job_id)
+        if draft is None:
+            return
+        live = self._live_preview if self._live_preview and self._live_preview["job_id"] == job_id else None
+
+        if final is not None:
+            draft.update(final, complete=True)
+            if live:
+                live["subject_label"].config(text=f"Subject: {draft['subject']}")
+                live["text"].delete(1.0, tk.END)
+                live["text"].insert(tk.END, draft["minutes"])
+            return
 
+        if subject is not None:
+            draft["subject"] = subject
+            if live:
+                live["subject_label"].config(text=f"Subject: {subject}")
+        if chunk is not None:
+            draft["minutes"] += chunk
+            if live:
+                live["text"].insert(tk.END, chunk)
 
     def log_message(self, message):
         """Helper to print messages to the GUI log with extra spacing."""
-        if self.log_text_widget.get(1.0, tk.END).strip():
+        if self.log_redirector.has_output:
             print("\n" + message)
         else:
             print(message)
@@ -132,7 +318,11 @@ class MeetingDispatcherApp:
     def browse_file(self):
         filepath = filedialog.askopenfilename(
             title="Select Meeting Minutes File",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[
+                ("Minutes files", "*.txt *.pdf *.docx *.vtt *.srt"),
+                ("Text files", "*.txt"),
+                ("All files", "*.*")
+            ]
         )
         if filepath:
             self.file_path_entry.delete(0, tk.END)
@@ -154,20 +344,31 @@ class MeetingDispatcherApp:
         else:
             self.log_message("Failed to load minutes from file. Check path or content.")
 
-    def show_email_preview(self, subject, body_content):
-        """Creates the popup window to preview the email and its options."""
+    def show_email_preview(self, subject, body_content, job_id=None):
+        """
+        Creates the popup window to preview the email and its options. When
+        job_id refers to a streaming draft, the body fills in as chunks arrive.
+        """
         # ... (The first part of the function is the same) ...
         preview_window = tk.Toplevel(self.master)
         preview_window.title("Email Preview - Confirm Dispatch")
         preview_window.transient(self.master)
         preview_window.grab_set()
 
-        tk.Label(preview_window, text=f"Subject: {subject}", font=('Arial', 12, 'bold'), wraplength=550).pack(pady=10, padx=10)
+        subject_label = tk.Label(preview_window, text=f"Subject: {subject or 'Generating...'}", font=('Arial', 12, 'bold'), wraplength=550)
+        subject_label.pack(pady=10, padx=10)
         tk.Label(preview_window, text="Meeting Minutes Body:").pack(pady=5, padx=10, anchor='w')
         preview_text_widget = scrolledtext.ScrolledText(preview_window, wrap=tk.WORD, width=80, height=20, relief="solid", borderwidth=1)
         preview_text_widget.pack(pady=5, padx=10, ipadx=5, ipady=5)
         preview_text_widget.insert(tk.END, body_content)
         preview_text_widget.bind("<Key>", lambda e: "break")
+        self._live_preview = {"job_id": job_id, "subject_label": subject_label, "text": preview_text_widget}
+
+        def current_content():
+            draft = self._drafts.get(job_id)
+            if draft is None:
+                return subject, body_content
+            return draft["subject"] or "Meeting Minutes", draft["minutes"]
 
         button_frame = tk.Frame(preview_window)
         button_frame.pack(pady=15)
@@ -185,7 +386,7 @@ class MeetingDispatcherApp:
         send_label.bind("<Button-1>", lambda e: e.widget.config(relief="sunken"))
         send_label.bind("<ButtonRelease-1>", lambda e: (
             e.widget.config(relief="raised"),
-            self._on_preview_action(preview_window, True)
+            self._on_preview_action(preview_window, True, job_id)
         ))
 
         # Save "Button" as a Label
@@ -199,7 +400,7 @@ class MeetingDispatcherApp:
         save_label.bind("<Button-1>", lambda e: e.widget.config(relief="sunken"))
         save_label.bind("<ButtonRelease-1>", lambda e: (
             e.widget.config(relief="raised"),
-            self._save_minutes_to_file(subject, body_content)
+            self._save_minutes_to_file(*current_content())
         ))
 
         # Cancel "Button" as a Label
@@ -218,8 +419,16 @@ class MeetingDispatcherApp:
 
         preview_window.protocol("WM_DELETE_WINDOW", lambda: self._on_preview_action(preview_window, False))
         self.master.wait_window(preview_window)
-
-    def _on_preview_action(self, window, confirmed):
+        self._live_preview = None
+
+    def _on_preview_action(self, window, confirmed, job_id=None):
+        draft = self._drafts.get(job_id)
+        if confirmed and draft is not None and not draft["complete"]:
+            if draft.get("failed"):
+                self.log_message("❌ This draft failed to generate and cannot be sent.")
+            else:
+                self.log_message("⏳ Minutes are still being generated. Please wait before sending.")
+            return
         self.preview_confirmed = confirmed
         window.destroy()
     
@@ -264,7 +473,7 @@ class MeetingDispatcherApp:
         
         # Clear the main text areas
         self.minutes_text_widget.delete(1.0, tk.END)
-        self.log_text_widget.delete(1.0, tk.END)
+        self.log_redirector.clear()
             
     def dispatch_minutes(self):
         self.log_message("\n--- Starting Meeting Minutes Dispatch ---")
@@ -273,37 +482,41 @@ class MeetingDispatcherApp:
             self.log_message("Error: No meeting minutes provided in the text area.")
             return
 
-        cleaned_minutes = clean_text(raw_minutes)
-
-        # Get emails from both sources
-        extracted_emails = set(extract_emails(cleaned_minutes))
-        if extracted_emails:
-            self.log_message(f"Found {len(extracted_emails)} recipient(s) in minutes text.")
-
         additional_emails_str = self.additional_recipients_entry.get().strip()
-        manual_emails = set()
-        if additional_emails_str:
-            manual_emails = set(email.strip() for email in additional_emails_str.split(',') if email.strip())
-            self.log_message(f"Found {len(manual_emails)} manually added recipient(s).")
-
-        all_recipients_set = extracted_emails.union(manual_emails)
-        self.log_message(f"Total unique recipients: {len(all_recipients_set)}")
+        self.engine.submit(raw_minutes, additional_emails_str)
 
-        if not all_recipients_set:
-            self.log_message("⚠️ No email addresses provided in the minutes or the recipients field.")
+    def _handle_draft(self, job_id):
+        """Shows previews one at a time, queueing drafts that arrive meanwhile."""
+        self._pending_drafts.append(job_id)
+        if self._preview_open:
             return
 
-        primary_to_email = SENDER_EMAIL
-        cc_recipients = [email for email in all_recipients_set if email.lower() != primary_to_email.lower()]
-
-        self.log_message("Requesting AI to generate subject and reformat minutes...")
-        meeting_subject = get_llm_generated_subject(cleaned_minutes)
-        detailed_description = get_llm_reformatted_minutes(cleaned_minutes)
-        self.log_message("AI generation complete.")
-
+        self._preview_open = True
+        try:
+            while self._pending_drafts:
+                job_id = self._pending_drafts.popleft()
+                draft = self._drafts[job_id]
+                self._log_draft_recipients(draft)
+                self.show_email_preview(draft["subject"], draft["minutes"], job_id)
+                del self._drafts[job_id]
+
+                if not self.preview_confirmed:
+                    self.log_message("🚫 Email sending cancelled by user from preview.")
+                    self.engine.cancel(job_id)
+                    if not draft["complete"] and not draft.get("failed"):
+                        self._cancelled_jobs.add(job_id)
+                    continue
+
+                self.log_message("Initiating email send...")
+                self.engine.send(job_id, draft)
+        finally:
+            self._preview_open = False
+
+    def _log_draft_recipients(self, draft):
         # --- MOVED: Log the recipient list BEFORE showing the preview window ---
+        cc_recipients = draft["cc"]
         self.log_message("\n--- Preparing Email Draft ---")
-        self.log_message(f"Primary Recipient (To): {primary_to_email}")
+        self.log_message(f"Primary Recipient (To): {draft['to']}")
         if cc_recipients:
             cc_display_list = cc_recipients[:5]
             additional_cc_count = len(cc_recipients) - 5
@@ -314,18 +527,12 @@ class MeetingDispatcherApp:
             self.log_message(log_str)
         else:
             self.log_message("No other recipients to CC.")
-        # -------------------------------------------------------------------
-
-        email_body = f"Dear Team,\n\nPlease find the meeting minutes below:\n\n{detailed_description}\n\nBest regards,\nYour Meeting Dispatcher Agent"
-        self.show_email_preview(meeting_subject, detailed_description)
 
-        if not self.preview_confirmed:
-            self.log_message("🚫 Email sending cancelled by user from preview.")
-            return
-        
-        self.log_message("Initiating email send...")
-        if send_email_collective(primary_to_email, cc_recipients, meeting_subject, email_body):
-            self._reset_ui()
+    def _handle_sent(self, ok):
+        if ok:
+            # Only clear the inputs when no other dispatch still depends on them.
+            if not self.engine.in_flight() and not self._pending_drafts:
+                self._reset_ui()
             self.log_message("✅ Collective email sent successfully.")
             self.log_message("--- Dispatch Process Complete ---")
         else:
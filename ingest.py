@@ -0,0 +1,193 @@
+"""
+File ingestion: turns minutes files into a lazy stream of text pieces.
+
+Plain-text files are read in fixed-size binary blocks and decoded
+incrementally, with the encoding sniffed from the first block (which is
+then reused, not re-read). PDF pages, DOCX paragraphs and VTT/SRT cues are
+produced one at a time, so a consumer such as agent_core.TextScanner can
+normalize a huge transcript without ever holding the whole raw file.
+
+PDF support needs the optional `pypdf` package; everything else is stdlib.
+"""
+import codecs
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from metrics import timed
+
+READ_BLOCK_SIZE = 1 << 20  # bytes per read for plain-text files
+SNIFF_SIZE = 64 * 1024     # bytes inspected to choose an encoding
+
+TEXT_EXTENSIONS = {".txt", ".md", ".log", ".csv"}
+TRANSCRIPT_EXTENSIONS = {".vtt", ".srt"}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | TRANSCRIPT_EXTENSIONS | {".pdf", ".docx"}
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_FALLBACK_ENCODING = "cp1252"
+
+_CUE_TIMING_RE = re.compile(r'^\s*(\d{1,2}:)?\d{1,2}:\d{2}[.,]\d{3}\s*-->')
+_CUE_TAG_RE = re.compile(r'<v(?:\.[^ >]*)?\s+([^>]+)>|<[^>]+>')
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class UnsupportedFileError(Exception):
+    """Raised when a file's format cannot be ingested."""
+
+
+def detect_encoding(head):
+    """Chooses an encoding from the first bytes of a file: BOM, then UTF-8, then cp1252."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        # final=False tolerates a multi-byte character cut off at the end of the sample.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return _FALLBACK_ENCODING
+
+
+def iter_text_file(filepath, block_size=READ_BLOCK_SIZE):
+    """Yields decoded text blocks from a plain-text file, sniffing the encoding once."""
+    with open(filepath, 'rb') as f:
+        head = f.read(max(block_size, SNIFF_SIZE))
+        decoder = codecs.getincrementaldecoder(detect_encoding(head[:SNIFF_SIZE]))(errors="replace")
+        block = head
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield text
+            block = f.read(block_size)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def _cue_text(line):
+    # "<v Alice>Hello" becomes "Alice: Hello"; other styling tags are dropped.
+    return _CUE_TAG_RE.sub(lambda m: f"{m.group(1).strip()}: " if m.group(1) else "", line).strip()
+
+
+def iter_transcript_cues(filepath):
+    """Yields one line of text per VTT/SRT cue, skipping headers, cue ids, timings and notes."""
+    cue = []
+    skip_block = False  # inside a NOTE, STYLE or REGION block, which runs to the next blank line
+    # A block's first line is its cue id (numeric in SRT, any text in VTT) only
+    # if a timing line follows; until then it is held back.
+    held = None
+    block_start = True
+
+    def lines():
+        pending = ""
+        for block in iter_text_file(filepath):
+            pending += block
+            *complete, pending = pending.split("\n")
+            yield from complete
+        if pending:
+            yield pending
+
+    def add(line):
+        text = _cue_text(line)
+        if text:
+            cue.append(text)
+
+    for raw in lines():
+        line = raw.strip()
+        if not line:
+            if held is not None:
+                add(held)
+                held = None
+            if cue:
+                yield " ".join(cue) + "\n"
+                cue = []
+            skip_block = False
+            block_start = True
+            continue
+        if skip_block or line.startswith("WEBVTT"):
+            continue
+        if line.startswith(("NOTE", "STYLE", "REGION")):
+            skip_block = True
+            continue
+        if _CUE_TIMING_RE.match(line):
+            held = None  # it was the cue id
+            block_start = False
+            continue
+        if block_start:
+            held = line
+            block_start = False
+            continue
+        if held is not None:
+            add(held)
+            held = None
+        add(line)
+    if held is not None:
+        add(held)
+    if cue:
+        yield " ".join(cue) + "\n"
+
+
+def iter_docx_paragraphs(filepath):
+    """Yields DOCX paragraphs one at a time by streaming word/document.xml."""
+    with zipfile.ZipFile(filepath) as archive:
+        with archive.open("word/document.xml") as document:
+            parts = []
+            for event, element in ElementTree.iterparse(document, events=("end",)):
+                if element.tag == f"{_WORD_NS}t" and element.text:
+                    parts.append(element.text)
+                elif element.tag == f"{_WORD_NS}tab":
+                    parts.append("\t")
+                elif element.tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                    parts.append("\n")
+                elif element.tag == f"{_WORD_NS}p":
+                    yield "".join(parts) + "\n"
+                    parts = []
+                    element.clear()
+
+
+def iter_pdf_pages(filepath):
+    """Yields the text of each PDF page in turn (requires pypdf)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedFileError("PDF support requires the 'pypdf' package (pip install pypdf).")
+    reader = PdfReader(filepath)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if text:
+            yield text + "\n"
+
+
+def iter_file_text(filepath):
+    """
+    Yields the text of a minutes file piece by piece, choosing a reader by
+    extension. Unknown extensions are treated as plain text.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == ".pdf":
+        return iter_pdf_pages(filepath)
+    if extension == ".docx":
+        return iter_docx_paragraphs(filepath)
+    if extension in TRANSCRIPT_EXTENSIONS:
+        return iter_transcript_cues(filepath)
+    return iter_text_file(filepath)
+
+
+@timed("read_file_content")
+def read_file_content(filepath):
+    """Reads the text of a .txt, .pdf, .docx, .vtt or .srt file."""
+    if not os.path.exists(filepath):
+        print(f"❌ Error: File not found at '{filepath}'")
+        return None
+    try:
+        return "".join(iter_file_text(filepath))
+    except Exception as e:
+        print(f"❌ Error reading file '{filepath}': {e}")
+        return None
@@ -0,0 +1,367 @@
+"""
+Durable dispatch job queue backed by sqlite (WAL mode).
+
+Each job moves through
+
+    ingested -> summarized -> previewed -> sending -> sent
+
+with side exits to `cancelled` and `failed`. The LLM outputs are stored as
+soon as they exist, so a crash or SMTP failure never wastes Gemini tokens,
+and every job carries an idempotency key derived from its cleaned text and
+recipients: enqueueing the same meeting again returns the existing job
+instead of creating (and sending) a duplicate.
+
+A job left in `sending` by a crash is not retried automatically, because the
+server may already have accepted it; recover_interrupted() marks it failed
+for a person to check. Otherwise JobWorkerPool resumes unfinished jobs
+from where they stopped.
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from agent_core import (
+    format_email_body,
+    deliver_email,
+    print_delivery_report,
+    get_llm_subject_and_minutes,
+    LLMUnavailableError
+)
+from llm_service import is_fallback_record
+
+# Each tool keeps its own queue: a batch run must not drain the GUI's jobs, and the GUI
+# must not open previews for jobs left over from batch dry runs.
+_QUEUE_DIR = os.path.join(os.path.expanduser("~"), ".meeting_dispatcher")
+DISPATCH_QUEUE_PATH = os.getenv("DISPATCH_QUEUE_PATH", os.path.join(_QUEUE_DIR, "jobs.sqlite"))            # GUI
+BATCH_QUEUE_PATH = os.getenv("BATCH_QUEUE_PATH", os.path.join(_QUEUE_DIR, "batch_jobs.sqlite"))        # batch_dispatch --queue
+SERVICE_QUEUE_PATH = os.getenv("SERVICE_QUEUE_PATH", os.path.join(_QUEUE_DIR, "service_jobs.sqlite"))  # dispatch_server
+JOB_LEASE_SECONDS = 600      # how long a worker may hold a job before others can reclaim it
+MAX_SEND_ATTEMPTS = 3
+LLM_RETRY_DELAY = 300        # seconds before a worker retries a job whose AI step failed
+
+STATE_INGESTED = "ingested"
+STATE_SUMMARIZED = "summarized"
+STATE_PREVIEWED = "previewed"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_CANCELLED = "cancelled"
+STATE_FAILED = "failed"
+
+UNFINISHED_STATES = (STATE_INGESTED, STATE_SUMMARIZED, STATE_PREVIEWED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    source TEXT,
+    cleaned_text TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    cc_json TEXT NOT NULL,
+    subject TEXT,
+    minutes TEXT,
+    auto_approve INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+def open_default_queue(path=DISPATCH_QUEUE_PATH):
+    """Opens the queue at path (the GUI's by default), or returns None (with a warning) if that fails."""
+    try:
+        return JobQueue(path)
+    except Exception as e:
+        print(f"⚠️ Dispatch job queue unavailable ({type(e).__name__}: {e}); continuing without crash recovery.")
+        return None
+
+
+def make_idempotency_key(cleaned_text, to_email, cc_emails):
+    """Hash of the minutes text and the case-folded, sorted recipient list."""
+    recipients = sorted({to_email.lower(), *(email.lower() for email in cc_emails)})
+    payload = json.dumps([cleaned_text, recipients], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def message_id_for(job):
+    """Stable Message-ID, so a resent job is recognisable as the same email."""
+    return f"<{job['idempotency_key'][:32]}@meeting-dispatcher.local>"
+
+
+class JobQueue:
+    """
+    sqlite-backed job store. Safe to share between threads (one connection
+    per thread), so it needs a file path: an in-memory database would be a
+    separate, empty one on every thread.
+    """
+
+    def __init__(self, path=DISPATCH_QUEUE_PATH):
+        if not path or path == ":memory:" or path.startswith("file:"):
+            raise ValueError(f"JobQueue needs a database file path, not {path!r}.")
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["cc"] = json.loads(job.pop("cc_json"))
+        job["auto_approve"] = bool(job["auto_approve"])
+        return job
+
+    def _update(self, job_id, expected_states=None, **fields):
+        """Updates a job (optionally only if in one of expected_states); returns True if it changed."""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        sql = f"UPDATE jobs SET {assignments} WHERE id = ?"
+        params = list(fields.values()) + [job_id]
+        if expected_states:
+            sql += f" AND state IN ({', '.join('?' for _ in expected_states)})"
+            params.extend(expected_states)
+        return self._conn().execute(sql, params).rowcount == 1
+
+    # --- Creating and reading jobs ---
+
+    def enqueue(self, cleaned_text, to_email, cc_emails, source=None, auto_approve=False, lease=False):
+        """
+        Adds a job, or returns the existing one with the same idempotency key.
+        A cancelled or failed duplicate is reopened, keeping any stored LLM output
+        (output saved by older versions from the error fallback is dropped).
+        With lease=True a new or reopened job is leased to the caller, so
+        worker pools leave it alone while the caller summarizes it.
+        """
+        key = make_idempotency_key(cleaned_text, to_email, cc_emails)
+        now = time.time()
+        lease_until = now + JOB_LEASE_SECONDS if lease else None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (idempotency_key, state, source, cleaned_text, to_email, cc_json, "
+                    "auto_approve, lease_until, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, STATE_INGESTED, source, cleaned_text, to_email, json.dumps(list(cc_emails)),
+                     int(auto_approve), lease_until, now, now),
+                )
+            elif row["state"] in (STATE_CANCELLED, STATE_FAILED):
+                usable = row["minutes"] is not None and not is_fallback_record(row["cleaned_text"], row)
+                conn.execute(
+                    "UPDATE jobs SET state = ?, subject = ?, minutes = ?, auto_approve = ?, error = NULL, "
+                    "attempts = 0, lease_until = ?, updated_at = ? WHERE id = ?",
+                    (STATE_SUMMARIZED if usable else STATE_INGESTED,
+                     row["subject"] if usable else None, row["minutes"] if usable else None,
+                     int(auto_approve), lease_until, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get_by_key(key)
+
+    def get(self, job_id):
+        return self._to_job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def get_by_key(self, key):
+        return self._to_job(self._conn().execute("SELECT * FROM jobs WHERE idempotency_key = ?", (key,)).fetchone())
+
+    def jobs_in(self, states):
+        placeholders = ", ".join("?" for _ in states)
+        rows = self._conn().execute(f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id", list(states))
+        return [self._to_job(row) for row in rows]
+
+    def counts(self):
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return {state: count for state, count in rows}
+
+    def claim_next(self):
+        """
+        Leases the oldest job a worker pool can advance on its own: any
+        ingested job, plus summarized/previewed jobs marked auto_approve.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE (state = ? OR (auto_approve = 1 AND state IN (?, ?))) "
+                "AND (lease_until IS NULL OR lease_until < ?) ORDER BY id LIMIT 1",
+                (STATE_INGESTED, STATE_SUMMARIZED, STATE_PREVIEWED, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ?",
+                             (now + JOB_LEASE_SECONDS, now, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    # --- State transitions ---
+
+    def mark_summarized(self, job_id, subject, minutes):
+        """Stores real model output; callers must not pass the LLM error fallback."""
+        return self._update(job_id, (STATE_INGESTED,), state=STATE_SUMMARIZED, subject=subject,
+                            minutes=minutes, lease_until=None)
+
+    def mark_previewed(self, job_id):
+        return self._update(job_id, (STATE_SUMMARIZED, STATE_PREVIEWED), state=STATE_PREVIEWED)
+
+    def begin_send(self, job_id):
+        """Atomically moves a previewed job to `sending`. False means someone else sent (or is sending) it."""
+        return self._update(job_id, (STATE_PREVIEWED,), state=STATE_SENDING, lease_until=time.time() + JOB_LEASE_SECONDS)
+
+    def mark_sent(self, job_id):
+        return self._update(job_id, (STATE_SENDING,), state=STATE_SENT, sent_at=time.time(), error=None, lease_until=None)
+
+    def mark_send_failed(self, job_id, error, remaining_cc=None):
+        """
+        SMTP rejected the send: go back to `previewed` for a retry, or fail after
+        MAX_SEND_ATTEMPTS. After a partial bulk send, remaining_cc narrows the
+        job to the recipients that still need the email.
+        """
+        job = self.get(job_id)
+        attempts = (job["attempts"] if job else 0) + 1
+        state = STATE_FAILED if attempts >= MAX_SEND_ATTEMPTS else STATE_PREVIEWED
+        fields = {"state": state, "attempts": attempts, "error": error, "lease_until": None}
+        if remaining_cc is not None:
+            fields["cc_json"] = json.dumps(list(remaining_cc))
+        return self._update(job_id, (STATE_SENDING,), **fields)
+
+    def release(self, job_id):
+        """Drops a worker's lease without changing state (e.g. the job now awaits a preview)."""
+        return self._update(job_id, None, lease_until=None)
+
+    def defer(self, job_id, seconds, error):
+        """Keeps the job in its state but out of reach of workers for `seconds` (e.g. while Gemini is down)."""
+        return self._update(job_id, None, error=error, lease_until=time.time() + seconds)
+
+    def mark_cancelled(self, job_id):
+        return self._update(job_id, UNFINISHED_STATES, state=STATE_CANCELLED, lease_until=None)
+
+    def mark_failed(self, job_id, error):
+        return self._update(job_id, None, state=STATE_FAILED, error=error, lease_until=None)
+
+    def recover_interrupted(self):
+        """Fails jobs whose send was interrupted (expired `sending` lease). Returns how many."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET state = ?, error = ?, lease_until = NULL, updated_at = ? "
+            "WHERE state = ? AND (lease_until IS NULL OR lease_until < ?)",
+            (STATE_FAILED, "Interrupted while sending; check the mailbox before re-dispatching.",
+             time.time(), STATE_SENDING, time.time()),
+        )
+        return cursor.rowcount
+
+
+def send_job(job_queue, job):
+    """Sends a previewed job exactly once. Returns True if this call sent it."""
+    if not job_queue.begin_send(job["id"]):
+        print(f"⚠️ Job {job['id']} was already sent (or is being sent); not sending again.")
+        return False
+    try:
+        report = deliver_email(job["to_email"], job["cc"], job["subject"], format_email_body(job["minutes"]),
+                               message_id=message_id_for(job))
+    except Exception as e:
+        job_queue.mark_send_failed(job["id"], f"{type(e).__name__}: {e}")
+        return False
+    print_delivery_report(report)
+    if report["failed"] and report["delivered"]:
+        # Partial bulk send: a retry only goes to the recipients that missed out.
+        remaining = [address for address in job["cc"] if address in report["failed"]]
+        job_queue.mark_send_failed(job["id"], f"{len(report['failed'])} recipient(s) not delivered.", remaining_cc=remaining)
+        return False
+    if report["failed"] or not report["delivered"]:
+        job_queue.mark_send_failed(job["id"], "SMTP send failed.")
+        return False
+    job_queue.mark_sent(job["id"])
+    return True
+
+
+class JobWorkerPool:
+    """
+    Worker threads that drain the queue: summarize ingested jobs and, for
+    auto-approved jobs, send them. Unfinished jobs from earlier runs are
+    picked up like new ones.
+    """
+
+    def __init__(self, job_queue, workers=2, poll_interval=0.5):
+        self.job_queue = job_queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def process(self, job):
+        """Advances one leased job as far as it can go without a human."""
+        try:
+            if job["state"] == STATE_INGESTED:
+                subject, minutes = get_llm_subject_and_minutes(job["cleaned_text"], fallback=False)
+                self.job_queue.mark_summarized(job["id"], subject, minutes)
+                job = self.job_queue.get(job["id"])
+            if job["auto_approve"] and job["state"] in (STATE_SUMMARIZED, STATE_PREVIEWED):
+                self.job_queue.mark_previewed(job["id"])
+                send_job(self.job_queue, self.job_queue.get(job["id"]))
+            else:
+                self.job_queue.release(job["id"])
+        except LLMUnavailableError as e:
+            # Leave it `ingested`; a later run (or this pool, after the delay) tries again.
+            print(f"⚠️ Job {job['id']}: AI generation failed ({e}); retrying in {LLM_RETRY_DELAY}s.")
+            self.job_queue.defer(job["id"], LLM_RETRY_DELAY, f"AI generation failed: {e}")
+        except Exception as e:
+            print(f"❌ Job {job['id']} failed: {type(e).__name__}: {e}")
+            self.job_queue.mark_failed(job["id"], f"{type(e).__name__}: {e}")
+
+    def _work(self, until_empty):
+        while not self._stop.is_set():
+            job = self.job_queue.claim_next()
+            if job is None:
+                if until_empty:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def drain(self):
+        """Processes every claimable job (including resumed ones), then returns."""
+        recovered = self.job_queue.recover_interrupted()
+        if recovered:
+            print(f"⚠️ {recovered} job(s) were interrupted mid-send and need checking.")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job") as executor:
+            list(executor.map(lambda _: self._work(True), range(self.workers)))
+
+    def start(self):
+        """Runs workers in the background until stop()."""
+        self.job_queue.recover_interrupted()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(False,), name=f"job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
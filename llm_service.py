@@ -1,13 +1,26 @@
 import os
-from dotenv import load_dotenv
-from google import genai 
-from google.genai import types 
 import sys
 import pprint # <--- NEW IMPORT for pretty printing
 import traceback # <--- NEW IMPORT for full tracebacks
+import concurrent.futures
+import collections
+import hashlib
+import json
+import threading
+import time
+import random
+import itertools
+import sqlite3
+
+from config import load_config
+from prompts import get_template, MINUTES_RECORD_SCHEMA, REVISION_SCHEMA
+from revisions import splice_sections
+import metrics
 
 # --- Configuration (Loaded only once when this module is imported) ---
-load_dotenv()
+# The Gemini SDK itself is imported lazily in _get_client(): it is slow to
+# import and not needed until the first request.
+load_config()
 sys.stdout.flush() 
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -17,8 +30,536 @@ if not GEMINI_API_KEY:
     sys.exit(1) # Exit if the key is missing
 
     
-_client = genai.Client(api_key=GEMINI_API_KEY)
-sys.stdout.flush()
+# Per-request wall-clock limit (seconds) for the concurrent path. Time spent queued for a
+# pool worker has its own limit of the same length.
+LLM_CALL_TIMEOUT = 90
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", str(LLM_CALL_TIMEOUT)))
+
+# Socket-level timeout for every Gemini HTTP request (milliseconds). Capped at the per-call
+# limit so a single hung attempt cannot outlive the call that made it.
+LLM_HTTP_TIMEOUT_MS = min(int(os.getenv("LLM_HTTP_TIMEOUT_MS", "60000")), LLM_CALL_TIMEOUT * 1000)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Imports the Gemini SDK and builds the shared client on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=GEMINI_API_KEY, http_options={"timeout": LLM_HTTP_TIMEOUT_MS})
+                sys.stdout.flush()
+    return _client
+
+
+def set_client(client):
+    """Replaces the Gemini client, e.g. with a fake for benchmarks or local testing."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def warm_up():
+    """Builds the client ahead of the first request (e.g. from a background thread)."""
+    _get_client()
+    _get_cache()
+
+SUBJECT_FALLBACK = "AI Agent Email - Meeting Minutes (LLM Error)"
+
+
+class LLMUnavailableError(Exception):
+    """The model gave no usable output (e.g. a stream broke off part-way)."""
+
+
+# Shared pool so the subject and minutes requests can be in flight together. Every dispatch
+# shares it, so it should allow two requests per concurrent dispatch.
+LLM_POOL_WORKERS = int(os.getenv("LLM_POOL_WORKERS", "8"))
+_llm_executor = concurrent.futures.ThreadPoolExecutor(max_workers=LLM_POOL_WORKERS, thread_name_prefix="llm")
+_call_state = threading.local()  # .deadline: monotonic time the LLM call on this thread must finish by
+
+# Response cache settings. Set LLM_CACHE_PATH to an empty string to keep the cache in memory only.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".meeting_dispatcher", "llm_cache.sqlite"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "5000"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_BUSY_TIMEOUT = 5.0  # seconds to wait for another process's write lock
+
+# One structured request for subject, minutes, action items and attendees instead of two
+# requests that each send the full text. Set LLM_COMBINED_CALL=0 to always use two calls.
+LLM_COMBINED_CALL = os.getenv("LLM_COMBINED_CALL", "1") not in ("", "0", "false", "no")
+
+# When notes are dispatched again after a small edit, revise only the affected sections of
+# the earlier output (see revisions.py). Callers opt in by passing their own RevisionStore,
+# so only one person's session shares bases. Set LLM_INCREMENTAL=0 to always regenerate in full.
+LLM_INCREMENTAL = os.getenv("LLM_INCREMENTAL", "1") not in ("", "0", "false", "no")
+
+# Long-input (map-reduce) settings. Minutes the "minutes" template routes to the chunked
+# path (see prompts.py) are split into overlapping chunks, summarized in parallel, then
+# merged in one final pass.
+CHUNK_SIZE = int(os.getenv("LLM_CHUNK_SIZE", "15000"))
+CHUNK_OVERLAP = int(os.getenv("LLM_CHUNK_OVERLAP", "1000"))
+CHUNK_PARALLELISM = int(os.getenv("LLM_CHUNK_PARALLELISM", "4"))
+
+# Client-side throttling and fault handling. Requests per minute are budgeted per model.
+LLM_RATE_LIMITS = {
+    "gemini-2.5-pro": float(os.getenv("LLM_RPM_PRO", "60")),
+    "gemini-2.5-flash": float(os.getenv("LLM_RPM_FLASH", "300")),
+}
+LLM_DEFAULT_RPM = float(os.getenv("LLM_RPM_DEFAULT", "60"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE = 1.0   # seconds
+LLM_BACKOFF_CAP = 20.0   # seconds
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # consecutive failures
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))        # seconds open before a trial call
+
+
+# --- Response Cache ---
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of Gemini responses, keyed by a hash of
+    (model, prompt, temperature, thinking_budget). An in-memory LRU tier sits
+    in front of an optional sqlite tier; both honour the same TTL.
+    """
+
+    def __init__(self, path=None, max_memory_entries=256, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()  # key -> (stored_at, text)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                # The GUI, batch runs and the dispatch service may share this file.
+                self._db = sqlite3.connect(path, timeout=LLM_CACHE_BUSY_TIMEOUT, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(f"PRAGMA busy_timeout = {int(LLM_CACHE_BUSY_TIMEOUT * 1000)}")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                    "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"⚠️ ai_service.py: LLM disk cache disabled ({type(e).__name__}: {e})")
+                self._db = None
+
+    @staticmethod
+    def make_key(model, prompt, temperature, thinking_budget, response_schema=None):
+        fields = [model, prompt, temperature, thinking_budget]
+        if response_schema is not None:
+            fields.append(response_schema)
+        payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at, now):
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Returns the cached text for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    text = self._disk_get(key, now)
+                except sqlite3.Error as e:
+                    self._disk_error("read", e)
+                    text = None
+                if text is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return text
+
+            self.misses += 1
+            return None
+
+    def _disk_get(self, key, now):
+        row = self._db.execute("SELECT text, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        text, stored_at = row
+        if self._expired(stored_at, now):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self._remember(key, stored_at, text)
+        return text
+
+    def put(self, key, text):
+        """Stores text for key. A failed disk write only costs the disk copy."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, text)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, text, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, text, now, now),
+                )
+                # Evict the least recently used rows beyond the size limit.
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._disk_error("write", e)
+
+    def _disk_error(self, action, error):
+        # A locked or full database must never cost a response that was already paid for.
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+        print(f"⚠️ ai_service.py: LLM disk cache {action} failed ({type(error).__name__}: {error}); continuing without it.")
+        sys.stdout.flush()
+
+    def _remember(self, key, stored_at, text):
+        self._memory[key] = (stored_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM responses")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    self._disk_error("clear", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+
+_response_cache = None
+
+
+def _get_cache():
+    """Opens the shared response cache (and its sqlite file) on first use."""
+    global _response_cache
+    if _response_cache is None:
+        with _client_lock:
+            if _response_cache is None:
+                _response_cache = LLMResponseCache(
+                    path=LLM_CACHE_PATH,
+                    max_memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+                    max_disk_entries=LLM_CACHE_DISK_ENTRIES,
+                    ttl_seconds=LLM_CACHE_TTL,
+                )
+    return _response_cache
+
+
+def get_cache_stats():
+    """Hit/miss counters for the shared LLM response cache."""
+    return _get_cache().stats()
+
+
+# --- Rate Limiting, Retry and Circuit Breaker ---
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+class TokenBucket:
+    """Blocking token-bucket limiter: `rate_per_minute` sustained, up to `burst` at once."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 10.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive retryable failures and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Gemini circuit breaker is open; failing fast.")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Gemini circuit breaker is half-open; trial call in progress.")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Ends a half-open trial that failed for a non-service reason."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+_limiters = {}
+_breakers = {}
+_retry_counts = collections.Counter()
+_guards_lock = threading.Lock()
+
+
+def _guards_for(model):
+    with _guards_lock:
+        if model not in _limiters:
+            _limiters[model] = TokenBucket(LLM_RATE_LIMITS.get(model, LLM_DEFAULT_RPM))
+            _breakers[model] = CircuitBreaker()
+        return _limiters[model], _breakers[model]
+
+
+_transient_errors = None
+
+
+def _transient_error_types():
+    # The genai SDK raises httpx transport/timeout errors, which don't subclass the
+    # built-in ConnectionError or TimeoutError. httpx is imported with the SDK.
+    global _transient_errors
+    if _transient_errors is None:
+        try:
+            import httpx
+            _transient_errors = (ConnectionError, TimeoutError, httpx.TransportError)
+        except ImportError:
+            _transient_errors = (ConnectionError, TimeoutError)
+    return _transient_errors
+
+
+def _is_retryable(error):
+    """429s, 5xx responses and network-level failures (including httpx timeouts) are worth retrying."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return isinstance(error, _transient_error_types())
+
+
+def _call_model(model, call):
+    """
+    Runs call() under the model's rate limiter and circuit breaker, retrying
+    retryable errors with jittered exponential backoff.
+    """
+    limiter, breaker = _guards_for(model)
+    attempt = 0
+    while True:
+        if _past_deadline():
+            raise TimeoutError(f"{model} call abandoned: the request's time budget is used up")
+        breaker.before_call()
+        limiter.acquire()
+        try:
+            result = call()
+        except Exception as e:
+            if not _is_retryable(e):
+                breaker.release_trial()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+            if attempt >= LLM_MAX_ATTEMPTS or _past_deadline(delay):
+                raise
+            with _guards_lock:
+                _retry_counts[model] += 1
+            print(f"⚠️ ai_service.py: {model} call failed ({type(e).__name__}); retry {attempt}/{LLM_MAX_ATTEMPTS - 1} in {delay:.1f}s.")
+            sys.stdout.flush()
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def _past_deadline(delay=0.0):
+    """True if the LLM call running on this thread would be past its deadline after `delay` seconds."""
+    deadline = getattr(_call_state, "deadline", None)
+    return deadline is not None and time.monotonic() + delay >= deadline
+
+
+def get_resilience_state():
+    """Per-model limiter, breaker and retry state, for batch runs and dashboards."""
+    with _guards_lock:
+        models = list(_limiters)
+    state = {}
+    for model in models:
+        limiter, breaker = _guards_for(model)
+        state[model] = {
+            "rpm": limiter.rate * 60,
+            "tokens_available": round(limiter.available(), 2),
+            "breaker_state": breaker.state,
+            "consecutive_failures": breaker.failures,
+            "retries": _retry_counts[model],
+        }
+    return state
+
+
+def _generation_config(temperature, thinking_budget, response_schema=None):
+    # The SDK accepts plain dicts for config, so no SDK types are needed here.
+    config = {
+        "thinking_config": {"thinking_budget": thinking_budget},
+        "temperature": temperature,
+    }
+    if response_schema is not None:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = response_schema
+    return config
+
+
+def _generate_text(model, prompt, temperature, thinking_budget, response_schema=None, parse=None):
+    """
+    Returns the model's stripped text for prompt, serving repeats from the
+    cache; with `parse`, returns parse(text) instead. Only non-empty text is
+    cached, and with `parse` only text it accepted, so a bad reply is asked
+    for again next time rather than replayed. Raises ValueError if the model
+    returns no text.
+    """
+    key = LLMResponseCache.make_key(model, prompt, temperature, thinking_budget, response_schema)
+    cached = _get_cache().get(key)
+    if cached:
+        try:
+            result = parse(cached) if parse else cached
+        except ValueError:
+            pass  # stored before replies were validated; ask again
+        else:
+            metrics.record("llm.cache_hit", 0.0, model=model)
+            return result
+
+    with metrics.stage("llm.generate", model=model):
+        response = _call_model(model, lambda: _get_client().models.generate_content(
+            model=model,
+            contents=prompt,
+            config=_generation_config(temperature, thinking_budget, response_schema),
+        ))
+    metrics.record_llm_usage(model, response, thinking_budget)
+    text = (response.text or "").strip()
+    if not text:
+        raise ValueError("model returned no text")
+    result = parse(text) if parse else text
+    _get_cache().put(key, text)
+    return result
+
+
+def _stream_text(model, prompt, temperature, thinking_budget):
+    """
+    Yields the model's text in chunks as they arrive. A cached response is
+    yielded whole; a completed stream with text is stored for next time.
+    """
+    key = LLMResponseCache.make_key(model, prompt, temperature, thinking_budget)
+    cached = _get_cache().get(key)
+    if cached:
+        metrics.record("llm.cache_hit", 0.0, model=model)
+        yield cached
+        return
+
+    def open_stream():
+        # Pull the first chunk inside the guarded call so connection errors are retried.
+        stream = iter(_get_client().models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=_generation_config(temperature, thinking_budget),
+        ))
+        return next(stream, None), stream
+
+    started = time.perf_counter()
+    with metrics.stage("llm.first_chunk", model=model):
+        first, stream = _call_model(model, open_stream)
+    parts = []
+    last_chunk = None
+    for chunk in itertools.chain([first] if first is not None else [], stream):
+        last_chunk = chunk
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    metrics.record("llm.stream", time.perf_counter() - started, model=model)
+    # The final chunk carries the usage totals for the whole stream.
+    metrics.record_llm_usage(model, last_chunk, thinking_budget)
+    text = "".join(parts).strip()
+    if text:
+        _get_cache().put(key, text)
+
+
+def _routed_request(template_name, input_text, **values):
+    """
+    Renders a registered template and picks its model and thinking budget
+    for input_text. Returns keyword arguments for _generate_text/_stream_text.
+    """
+    template = get_template(template_name)
+    route = template.route(input_text)
+    metrics.record("llm.route", 0.0, template=template_name, model=route.model)
+    return {
+        "model": route.model,
+        "prompt": template.render(**values),
+        "temperature": template.temperature,
+        "thinking_budget": route.thinking_budget,
+    }
 
 
 # --- LLM Helper Functions ---
@@ -26,84 +567,411 @@ sys.stdout.flush()
 def generate_subject_with_llm(minutes_text):
     sys.stdout.flush()
     try:
-        subject_prompt = (
-            "Provide an appropriate email subject title for the following meeting minutes. "
-            "The response should be less than 5 words maximum: "
-            f"\n\n{minutes_text}"
-        )
-
-        sys.stdout.flush()
-        
-        response = _client.models.generate_content(
-            model="gemini-2.5-pro", 
-            contents=subject_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=500),
-                temperature=0.2       
-            ),
-        )
+        response_text = _generate_text(**_routed_request("subject", minutes_text, minutes=minutes_text))
         
         sys.stdout.flush()
         
-        subject = response.text.strip().replace('**', '') 
+        subject = response_text.replace('**', '') 
         return subject
     except Exception as e:
         print(f"❌ ai_service.py: Error in subject generation: {type(e).__name__}: {e}")
         traceback.print_exc(file=sys.stdout) # <--- PRINT FULL TRACEBACK TO CONSOLE
         sys.stdout.flush()
-        return "AI Agent Email - Meeting Minutes (LLM Error)"
+        return SUBJECT_FALLBACK
+
+def _minutes_request(minutes_text):
+    """Request settings shared by the blocking and streaming reformatting paths."""
+    notes = condense_long_minutes(minutes_text)
+    return _routed_request("minutes", notes, minutes=notes)
+
+def split_into_chunks(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Splits text into chunks of about chunk_size characters, each starting
+    `overlap` characters before the previous one ended. Cuts are moved back to
+    the nearest whitespace so words are not split.
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    overlap = min(overlap, chunk_size // 2)
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            cut = text.rfind(' ', start + chunk_size // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        # Always move forward, even when a cut near the window's midpoint eats the whole overlap.
+        start = end - overlap if end - overlap > start else end
+    return chunks
+
+def _summarize_chunk(chunk, index, total, deadline=None):
+    """Map step: condenses one chunk into factual notes. Falls back to the raw chunk."""
+    _call_state.deadline = deadline  # the caller's budget carries over to the chunk pool
+    try:
+        return _generate_text(**_routed_request("chunk", chunk, chunk=chunk, index=index, total=total))
+    except Exception as e:
+        print(f"❌ ai_service.py: Error summarizing chunk {index}/{total}: {type(e).__name__}: {e}")
+        sys.stdout.flush()
+        return chunk
+    finally:
+        _call_state.deadline = None
+
+def condense_long_minutes(minutes_text, threshold=None, chunk_size=CHUNK_SIZE,
+                          overlap=CHUNK_OVERLAP, parallelism=CHUNK_PARALLELISM):
+    """
+    Returns minutes_text unchanged when it is short: within `threshold`
+    characters if given, otherwise when the "minutes" template's token
+    estimate does not route it to the chunked path. Longer text is split into
+    overlapping chunks that are summarized in parallel, and the joined notes
+    are returned for the usual reformatting prompt to merge.
+    """
+    if threshold is not None:
+        is_long = len(minutes_text) > threshold
+    else:
+        is_long = get_template("minutes").route(minutes_text).chunked
+    if not is_long:
+        return minutes_text
+
+    chunks = split_into_chunks(minutes_text, chunk_size, overlap)
+    print(f"ai_service.py: Long input ({len(minutes_text)} chars); summarizing {len(chunks)} chunks...")
+    sys.stdout.flush()
+
+    # A dedicated pool: this may already be running on a _llm_executor thread.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="llm-chunk") as pool:
+        notes = list(pool.map(_summarize_chunk, chunks, range(1, len(chunks) + 1), [len(chunks)] * len(chunks),
+                              [getattr(_call_state, "deadline", None)] * len(chunks)))
+
+    return "\n\n".join(f"[Part {i} of {len(notes)}]\n{note}" for i, note in enumerate(notes, 1))
 
 def reformat_minutes_with_llm(minutes_text):
     sys.stdout.flush()
     try:
-        minutes_reformat_prompt = (
-            "You are an expert administrative assistant specializing in transforming raw, informal, or unpolished meeting notes into professional, structured, and highly readable meeting minutes. Your goal is to improve clarity, organization, and conciseness while accurately preserving all factual information, key discussions, decisions made, and assigned action items."
-            "\n\nStrictly adhere to the following formatting and content guidelines:"
-            "\n1. Input Quality: Assume the provided notes might be raw, conversational, or taken quickly, possibly lacking formal structure or consistent formatting."
-            "\n2. Output Purpose: The final output must be a stand-alone, formal meeting minutes document."
-            "\n3. Structure: Organize the minutes using clear, professional headings. Recommended headings include:"
-            "\n4. NEVER start the response with 'Meeting Minutes'. Always start the response with Meeting Details"
-            "\n'Meeting Details' (for Date, Time, Location, etc.)"
-            "\n'Attendees'"
-            "\n'Discussion Summary'"
-            "\n'Decisions Made'"
-            "\n'Action Items'"
-            "\n'Next Meeting' (if applicable)"
-            "\n4. Content Transformation:"
-            "\n  - Condense conversational exchanges into concise discussion points."
-            "\n  - Clearly delineate decisions and action items."
-            "\n  - Ensure all responsibilities and due dates for action items are explicit."
-            "\n  - CRITICAL: Identify and REMOVE all email addresses from the output. Ensure they are not present in the 'Attendees' list or any other section of the reformatted minutes."
-            "\n5. Formatting:"
-            "\n  - Use bullet points for lists (e.g., attendees, discussion points, action items)."
-            "\n  - Ensure distinct paragraphs using double newlines for proper vertical spacing."
-            "\n  - For all bulleted or sub-items, use exactly 4 spaces for indentation." 
-            "\n6. Tone & Style:"
-            "\n  - Maintain a neutral, objective, and formal tone throughout."
-            "\n  - Avoid any conversational filler, slang, or subjective commentary."
-            # "\n  - CRITICAL: Output MUST be plain text. Do NOT use any Markdown formatting (e.g., no asterisks for bolding, hash symbols for headings, backticks for code blocks). Use only natural line breaks and spaces for formatting."
-            # "\n  - CRITICAL: Do NOT include any email-specific framing (e.g., 'Dear Team', 'Here are the minutes', 'Best regards', 'Subject:'). Provide only the reformatted meeting minutes content."
-            f"\n\nHere are the raw meeting notes to be transformed into professional minutes:\n{minutes_text}"
-        )
-
-        sys.stdout.flush()
-        
-        response = _client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=minutes_reformat_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=500),
-                temperature=0.3       
-            ),
-        )
+        response_text = _generate_text(**_minutes_request(minutes_text))
         
 
         sys.stdout.flush()
         
-        reformatted_minutes = response.text.strip().replace('**', '') 
+        reformatted_minutes = response_text.replace('**', '') 
         return reformatted_minutes
     except Exception as e:
         print(f"❌ ai_service.py: Error reformatting minutes: {type(e).__name__}: {e}")
         traceback.print_exc(file=sys.stdout) # <--- PRINT FULL TRACEBACK TO CONSOLE
         sys.stdout.flush()
-        return minutes_text
\ No newline at end of file
+        return minutes_text
+
+def parse_minutes_record(response_text):
+    """
+    Parses and validates a combined response. Returns a dict with subject,
+    minutes, action_items (list of {task, owner, due}) and attendees (list of
+    names); raises ValueError if the JSON is missing or malformed.
+    """
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"response is not JSON ({e})")
+    if not isinstance(data, dict):
+        raise ValueError("response is not a JSON object")
+
+    subject = data.get("subject")
+    minutes = data.get("minutes")
+    if not isinstance(subject, str) or not subject.strip():
+        raise ValueError("missing subject")
+    if not isinstance(minutes, str) or not minutes.strip():
+        raise ValueError("missing minutes")
+
+    action_items = []
+    for item in data.get("action_items") or []:
+        if isinstance(item, str):
+            item = {"task": item}
+        if not isinstance(item, dict) or not str(item.get("task") or "").strip():
+            raise ValueError("malformed action item")
+        action_items.append({key: str(item.get(key) or "").strip() for key in ("task", "owner", "due")})
+
+    attendees = data.get("attendees") or []
+    if not isinstance(attendees, list) or not all(isinstance(name, str) for name in attendees):
+        raise ValueError("malformed attendees")
+
+    return {
+        "subject": subject.replace('**', '').strip(),
+        "minutes": minutes.replace('**', '').strip(),
+        "action_items": action_items,
+        "attendees": [name.strip() for name in attendees if name.strip()],
+    }
+
+def generate_minutes_record(minutes_text):
+    """
+    One structured request for the subject, reformatted minutes, action items
+    and attendees, so the notes are sent (and billed) once. Returns the
+    validated record, or None if the request or its parsing fails.
+    """
+    try:
+        notes = condense_long_minutes(minutes_text)
+        return _generate_text(response_schema=MINUTES_RECORD_SCHEMA, parse=parse_minutes_record,
+                              **_routed_request("combined", notes, minutes=notes))
+    except Exception as e:
+        print(f"⚠️ ai_service.py: Combined request unusable ({type(e).__name__}: {e}); using separate requests.")
+        sys.stdout.flush()
+        metrics.record("llm.combined_fallback", 0.0, reason=type(e).__name__)
+        return None
+
+def _format_changes(changes):
+    return "\n\n".join(
+        f"Edit {i}:\nBefore: {before or '(nothing)'}\nAfter: {after or '(removed)'}"
+        for i, (before, after) in enumerate(changes, 1)
+    )
+
+def revise_minutes_with_llm(previous_minutes, changes):
+    """
+    Asks the model for only the sections affected by `changes` (a list of
+    (before, after) passages) and splices them into previous_minutes.
+    Returns (minutes, revised_headings); raises ValueError if the response
+    or the previous minutes can't be used.
+    """
+    changes_text = _format_changes(changes)
+    request = _routed_request("revise", previous_minutes + changes_text,
+                              minutes=previous_minutes, changes=changes_text)
+    return _generate_text(response_schema=REVISION_SCHEMA,
+                          parse=lambda response_text: _parse_revision(previous_minutes, response_text), **request)
+
+def _parse_revision(previous_minutes, response_text):
+    """Validates a revision response and splices it into previous_minutes; raises ValueError if unusable."""
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"response is not JSON ({e})")
+    sections = data.get("sections") if isinstance(data, dict) else None
+    if not isinstance(sections, list):
+        raise ValueError("missing sections")
+
+    revised = {}
+    for section in sections:
+        if not isinstance(section, dict) or not isinstance(section.get("heading"), str) \
+                or not isinstance(section.get("text"), str) or not section["heading"].strip():
+            raise ValueError("malformed section")
+        revised[section["heading"].replace('**', '').strip()] = section["text"].replace('**', '')
+    minutes = splice_sections(previous_minutes, revised)
+    if minutes is None:
+        raise ValueError("previous minutes have no recognisable sections")
+    return minutes, {heading.lstrip("#").strip().rstrip(":").strip().casefold() for heading in revised}
+
+def incremental_minutes_record(minutes_text, revisions):
+    """
+    If these notes are a small edit of notes remembered in `revisions` (the
+    caller's RevisionStore, or None to skip), returns the earlier record with
+    only the affected sections revised (subject kept). Action items or
+    attendees are dropped when their section changed. Returns None when a
+    full generation is needed.
+    """
+    if not LLM_INCREMENTAL or revisions is None:
+        return None
+    base = revisions.find_base(minutes_text)
+    if base is None:
+        return None
+    previous, changes = base
+    try:
+        with metrics.stage("llm.incremental"):
+            minutes, revised_headings = revise_minutes_with_llm(previous["minutes"], changes)
+    except Exception as e:
+        print(f"⚠️ ai_service.py: Incremental update failed ({type(e).__name__}: {e}); regenerating in full.")
+        sys.stdout.flush()
+        return None
+
+    print(f"ai_service.py: Notes edited in {len(changes)} place(s); revised {len(revised_headings)} section(s) of the earlier minutes.")
+    sys.stdout.flush()
+    record = {
+        "subject": previous["subject"],
+        "minutes": minutes,
+        "action_items": [] if "action items" in revised_headings else previous.get("action_items", []),
+        "attendees": [] if "attendees" in revised_headings else previous.get("attendees", []),
+    }
+    revisions.remember(minutes_text, record)
+    return record
+
+def is_fallback_record(minutes_text, record):
+    """True if a record holds the error fallback (raw notes or the error subject) rather than model output."""
+    return not record["minutes"] or record["minutes"] == minutes_text or record["subject"] == SUBJECT_FALLBACK
+
+def _remember_run(minutes_text, record, revisions):
+    # Fallback output is no base for later edits.
+    if revisions is not None and not is_fallback_record(minutes_text, record):
+        revisions.remember(minutes_text, record)
+
+def _submit_llm(timeout, fn, *args):
+    """
+    Submits an LLM call to the shared pool; future.started is set once a
+    worker runs it. From then on the call has `timeout` seconds: retries stop
+    once they would run past it, so a timed-out call frees its worker.
+    """
+    started = threading.Event()
+
+    def run():
+        started.set()
+        _call_state.deadline = time.monotonic() + timeout
+        try:
+            return fn(*args)
+        finally:
+            _call_state.deadline = None
+
+    future = _llm_executor.submit(run)
+    future.started = started
+    return future
+
+def _result_or_fallback(future, timeout, fallback, label):
+    """
+    Waits for an LLM future, returning the fallback on timeout. The timeout
+    starts when a worker picks the call up; waiting for a free worker is
+    limited separately by LLM_QUEUE_TIMEOUT, and a call still queued then is
+    dropped.
+    """
+    if not future.started.wait(LLM_QUEUE_TIMEOUT) and future.cancel():
+        print(f"❌ ai_service.py: {label} waited {LLM_QUEUE_TIMEOUT}s for a free LLM worker; giving up.")
+        sys.stdout.flush()
+        return fallback
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        # A running call can't be cancelled; its retries stop at the deadline _submit_llm set.
+        print(f"❌ ai_service.py: {label} timed out after {timeout}s.")
+        sys.stdout.flush()
+        return fallback
+
+def generate_subject_and_minutes(minutes_text, timeout=LLM_CALL_TIMEOUT, fallback=True, revisions=None):
+    """
+    Returns (subject, reformatted_minutes); see generate_minutes_record_or_fallback.
+    """
+    record = generate_minutes_record_or_fallback(minutes_text, timeout, fallback=fallback, revisions=revisions)
+    return record["subject"], record["minutes"]
+
+def generate_minutes_record_or_fallback(minutes_text, timeout=LLM_CALL_TIMEOUT, combined=None, fallback=True,
+                                        revisions=None):
+    """
+    Returns a record with subject, minutes, action_items and attendees. Tries
+    the single combined request first (unless disabled), then falls back to
+    fanning the subject and reformatting requests out together; action_items
+    and attendees are empty on that path. Each wait is bounded by `timeout`
+    seconds, and a combined request that times out is not retried. Given a
+    RevisionStore, a small edit of notes generated earlier in that session
+    is revised incrementally.
+
+    When the model fails, the record holds the error subject and the raw
+    notes; with fallback=False, LLMUnavailableError is raised instead, for
+    callers that store or send the output without a person looking at it.
+    """
+    if revisions is not None:
+        incremental_future = _submit_llm(timeout, incremental_minutes_record, minutes_text, revisions)
+        record = _result_or_fallback(incremental_future, timeout, None, "Incremental update")
+        if record:
+            return record
+
+    if LLM_COMBINED_CALL if combined is None else combined:
+        future = _submit_llm(timeout, generate_minutes_record, minutes_text)
+        record = _result_or_fallback(future, timeout, False, "Combined generation")
+        if record:
+            _remember_run(minutes_text, record, revisions)
+            return record
+        if record is False:
+            if not fallback:
+                raise LLMUnavailableError("combined request timed out")
+            return {"subject": SUBJECT_FALLBACK, "minutes": minutes_text, "action_items": [], "attendees": []}
+
+    # Condense once up front, so a long transcript is not sent whole to the subject request.
+    notes = condense_long_minutes(minutes_text)
+    subject_future = _submit_llm(timeout, generate_subject_with_llm, notes)
+    minutes_future = _submit_llm(timeout, reformat_minutes_with_llm, notes)
+
+    subject = _result_or_fallback(subject_future, timeout, SUBJECT_FALLBACK, "Subject generation")
+    minutes = _result_or_fallback(minutes_future, timeout, minutes_text, "Minutes reformatting")
+    if minutes == notes:
+        minutes = minutes_text
+    record = {"subject": subject, "minutes": minutes, "action_items": [], "attendees": []}
+    if not fallback and is_fallback_record(minutes_text, record):
+        raise LLMUnavailableError("no usable subject or minutes from the model")
+    _remember_run(minutes_text, record, revisions)
+    return record
+
+def stream_reformatted_minutes(minutes_text, fallback=True):
+    """
+    Streaming variant of reformat_minutes_with_llm: yields the reformatted
+    minutes in chunks as the model produces them. If the request fails before
+    any text arrives, or the stream ends without any (a blocked or empty
+    response), the raw minutes are yielded instead (or, with fallback=False,
+    LLMUnavailableError is raised); if it fails after that,
+    LLMUnavailableError is raised so the cut-off text is never used as a
+    complete draft.
+    """
+    yielded_any = False
+    held = ""
+    try:
+        for chunk in _stream_text(**_minutes_request(minutes_text)):
+            # Hold back a trailing '*' so a '**' split across chunks is still removed.
+            text = (held + chunk).replace('**', '')
+            held = ""
+            if text.endswith('*'):
+                text, held = text[:-1], '*'
+            if text:
+                yielded_any = yielded_any or bool(text.strip())
+                yield text
+        if held:
+            yielded_any = True
+            yield held
+    except Exception as e:
+        print(f"❌ ai_service.py: Error streaming minutes: {type(e).__name__}: {e}")
+        traceback.print_exc(file=sys.stdout) # <--- PRINT FULL TRACEBACK TO CONSOLE
+        sys.stdout.flush()
+        if yielded_any:
+            raise LLMUnavailableError(f"minutes stream interrupted ({type(e).__name__}: {e})") from e
+        if not fallback:
+            raise LLMUnavailableError(f"minutes request failed ({type(e).__name__}: {e})") from e
+        yield minutes_text
+        return
+
+    if not yielded_any:
+        print("❌ ai_service.py: Minutes stream ended without any text.")
+        sys.stdout.flush()
+        if not fallback:
+            raise LLMUnavailableError("minutes stream returned no text")
+        yield minutes_text
+
+def stream_subject_and_minutes(minutes_text, timeout=LLM_CALL_TIMEOUT, fallback=True, revisions=None):
+    """
+    Runs subject generation in the background while streaming the minutes.
+    Yields ("minutes", chunk) events as text arrives and exactly one
+    ("subject", subject) event, as soon as the subject is ready. Given a
+    RevisionStore, a small edit of notes generated earlier in that session
+    arrives as one revised "minutes" event instead. Raises LLMUnavailableError if the minutes
+    stream breaks off (or, with fallback=False, if either request fails);
+    nothing is remembered in that case.
+    """
+    record = incremental_minutes_record(minutes_text, revisions)
+    if record:
+        yield "minutes", record["minutes"]
+        yield "subject", record["subject"]
+        return
+
+    notes = condense_long_minutes(minutes_text)
+    subject_future = _submit_llm(timeout, generate_subject_with_llm, notes)
+    subject = None
+    parts = []
+
+    for chunk in stream_reformatted_minutes(notes, fallback=fallback):
+        if subject is None and subject_future.done():
+            subject = subject_future.result()
+            if not fallback and subject == SUBJECT_FALLBACK:
+                raise LLMUnavailableError("subject request failed")
+            yield "subject", subject
+        parts.append(chunk)
+        yield "minutes", chunk
+
+    if subject is None:
+        subject = _result_or_fallback(subject_future, timeout, SUBJECT_FALLBACK, "Subject generation")
+        if not fallback and subject == SUBJECT_FALLBACK:
+            raise LLMUnavailableError("subject request failed")
+        yield "subject", subject
+    record = {"subject": subject, "minutes": "".join(parts).strip(), "action_items": [], "attendees": []}
+    if not is_fallback_record(notes, record):
+        _remember_run(minutes_text, record, revisions)
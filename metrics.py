@@ -0,0 +1,176 @@
+"""
+Lightweight latency and token-usage metrics for the dispatch pipeline.
+
+    with stage("smtp.send"):
+        ...
+
+    @timed("clean_text")
+    def clean_text(text): ...
+
+Samples are kept in memory (bounded per stage) for p50/p95 summaries. Set
+METRICS_JSONL_PATH to also append every sample as a JSON line, and call
+write_prometheus(path) or prometheus_text() for a Prometheus text-format
+snapshot.
+"""
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH")
+MAX_SAMPLES_PER_STAGE = 2000
+
+_lock = threading.Lock()
+_samples = collections.defaultdict(lambda: collections.deque(maxlen=MAX_SAMPLES_PER_STAGE))
+_counts = collections.Counter()
+_sums = collections.Counter()
+_tokens = collections.Counter()  # (model, kind) -> tokens
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def record(name, seconds, **labels):
+    """Records one timing sample for a stage, with optional string labels."""
+    key = _key(name, labels)
+    with _lock:
+        _samples[key].append(seconds)
+        _counts[key] += 1
+        _sums[key] += seconds
+    _emit({"type": "timing", "stage": name, "seconds": round(seconds, 6), **labels})
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    """Times the enclosed block; failures are recorded with status="error"."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record(name, time.perf_counter() - started, status=status, **labels)
+
+
+def timed(name, **labels):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(model, response, thinking_budget=None):
+    """Adds token counts from a Gemini response's usage_metadata, if present."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    counts = {
+        "prompt": getattr(usage, "prompt_token_count", None) or 0,
+        "output": getattr(usage, "candidates_token_count", None) or 0,
+        "thinking": getattr(usage, "thoughts_token_count", None) or 0,
+        "total": getattr(usage, "total_token_count", None) or 0,
+    }
+    with _lock:
+        for kind, value in counts.items():
+            _tokens[(model, kind)] += value
+    _emit({"type": "tokens", "model": model, "thinking_budget": thinking_budget, **counts})
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summary():
+    """Per-stage count, mean, p50 and p95 (seconds) plus token totals per model."""
+    with _lock:
+        snapshot = {key: sorted(values) for key, values in _samples.items()}
+        counts = dict(_counts)
+        sums = dict(_sums)
+        tokens = dict(_tokens)
+
+    stages = {}
+    for (name, labels), values in snapshot.items():
+        label_str = ",".join(f"{k}={v}" for k, v in labels)
+        stages[f"{name}{{{label_str}}}" if label_str else name] = {
+            "count": counts[(name, labels)],
+            "mean": sums[(name, labels)] / counts[(name, labels)],
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+        }
+
+    token_totals = collections.defaultdict(dict)
+    for (model, kind), value in tokens.items():
+        token_totals[model][kind] = value
+    return {"stages": stages, "tokens": dict(token_totals)}
+
+
+def prometheus_text():
+    """Returns a Prometheus text-format snapshot (summaries and token counters)."""
+    with _lock:
+        snapshot = {key: sorted(values) for key, values in _samples.items()}
+        counts = dict(_counts)
+        sums = dict(_sums)
+        tokens = dict(_tokens)
+
+    def fmt_labels(pairs):
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+    lines = [
+        "# HELP dispatch_stage_seconds Time spent per dispatch pipeline stage.",
+        "# TYPE dispatch_stage_seconds summary",
+    ]
+    for (name, labels), values in sorted(snapshot.items()):
+        base = (("stage", name),) + labels
+        for quantile in (0.5, 0.95):
+            lines.append(f"dispatch_stage_seconds{fmt_labels(base + (('quantile', quantile),))} {_percentile(values, quantile):.6f}")
+        lines.append(f"dispatch_stage_seconds_sum{fmt_labels(base)} {sums[(name, labels)]:.6f}")
+        lines.append(f"dispatch_stage_seconds_count{fmt_labels(base)} {counts[(name, labels)]}")
+
+    lines.append("# HELP llm_tokens_total Gemini tokens used, by model and kind.")
+    lines.append("# TYPE llm_tokens_total counter")
+    for (model, kind), value in sorted(tokens.items()):
+        lines.append(f"llm_tokens_total{fmt_labels((('model', model), ('kind', kind)))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Writes prometheus_text() to path atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def reset():
+    """Clears all recorded samples and counters."""
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+        _sums.clear()
+        _tokens.clear()
+
+
+def _emit(event):
+    if not METRICS_JSONL_PATH:
+        return
+    event["ts"] = time.time()
+    line = json.dumps(event, ensure_ascii=False)
+    with _lock:
+        try:
+            with open(METRICS_JSONL_PATH, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
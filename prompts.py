@@ -0,0 +1,271 @@
+"""
+Prompt and model registry for llm_service.
+
+Each named template carries its prompt text plus the model settings used to
+run it. Templates are parsed once into literal/placeholder segments, so
+render() is a single join instead of rebuilding a large string literal.
+
+Model choice is made per request by route(): a cheap pre-flight token
+estimate picks the first tier whose limit fits the input, and inputs above
+the template's chunk limit are flagged for the map-reduce path. Small inputs
+can therefore use gemini-2.5-flash without thinking while large ones get
+the model and budget they need.
+
+Settings can be overridden without code changes from a JSON file at
+LLM_PROMPTS_PATH:
+
+    {"subject": {"tiers": [[null, "gemini-2.5-flash", 0]]},
+     "minutes": {"temperature": 0.2, "chunk_above_tokens": 30000}}
+"""
+import collections
+import json
+import os
+import string
+import threading
+
+from config import load_config
+
+load_config()
+
+LLM_PROMPTS_PATH = os.getenv("LLM_PROMPTS_PATH", os.path.join(os.path.expanduser("~"), ".meeting_dispatcher", "prompts.json"))
+CHARS_PER_TOKEN = 4  # rough average for English prose with Gemini tokenizers
+# Inputs longer than this (in characters) take the chunked path; see llm_service.condense_long_minutes.
+LONG_INPUT_THRESHOLD = int(os.getenv("LLM_LONG_INPUT_THRESHOLD", "60000"))
+
+Route = collections.namedtuple("Route", ["model", "thinking_budget", "estimated_tokens", "chunked"])
+
+
+def estimate_tokens(text):
+    """Pre-flight token estimate (no API call): about one token per CHARS_PER_TOKEN characters."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptTemplate:
+    """
+    A named prompt with its model settings. `tiers` is a list of
+    (max_input_tokens, model, thinking_budget) tried in order; a limit of
+    None matches any size. Inputs over chunk_above_tokens are routed to the
+    chunked path (None disables it).
+    """
+
+    def __init__(self, name, text, tiers, temperature=0.2, chunk_above_tokens=None):
+        self.name = name
+        self.text = text
+        self.tiers = [tuple(tier) for tier in tiers]
+        self.temperature = temperature
+        self.chunk_above_tokens = chunk_above_tokens
+        self._segments = [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+        self.fields = {field for _, field in self._segments if field}
+
+    def render(self, **values):
+        """Fills the placeholders; every field must be given."""
+        parts = []
+        for literal, field in self._segments:
+            parts.append(literal)
+            if field:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+    def route(self, input_text):
+        """Chooses the model and thinking budget for input_text from its estimated size."""
+        tokens = estimate_tokens(input_text)
+        chunked = self.chunk_above_tokens is not None and tokens > self.chunk_above_tokens
+        for max_tokens, model, thinking_budget in self.tiers:
+            if max_tokens is None or tokens <= max_tokens:
+                return Route(model, thinking_budget, tokens, chunked)
+        _, model, thinking_budget = self.tiers[-1]
+        return Route(model, thinking_budget, tokens, chunked)
+
+    def with_overrides(self, overrides):
+        """Returns a copy with fields replaced from a JSON override entry."""
+        return PromptTemplate(
+            self.name,
+            overrides.get("text", self.text),
+            overrides.get("tiers", self.tiers),
+            overrides.get("temperature", self.temperature),
+            overrides.get("chunk_above_tokens", self.chunk_above_tokens),
+        )
+
+
+# --- Built-in Templates ---
+
+SUBJECT_PROMPT = (
+    "Provide an appropriate email subject title for the following meeting minutes. "
+    "The response should be less than 5 words maximum: "
+    "\n\n{minutes}"
+)
+
+MINUTES_GUIDELINES = (
+    "You are an expert administrative assistant specializing in transforming raw, informal, or unpolished meeting notes into professional, structured, and highly readable meeting minutes. Your goal is to improve clarity, organization, and conciseness while accurately preserving all factual information, key discussions, decisions made, and assigned action items."
+    "\n\nStrictly adhere to the following formatting and content guidelines:"
+    "\n1. Input Quality: Assume the provided notes might be raw, conversational, or taken quickly, possibly lacking formal structure or consistent formatting."
+    "\n2. Output Purpose: The final output must be a stand-alone, formal meeting minutes document."
+    "\n3. Structure: Organize the minutes using clear, professional headings. Recommended headings include:"
+    "\n4. NEVER start the response with 'Meeting Minutes'. Always start the response with Meeting Details"
+    "\n'Meeting Details' (for Date, Time, Location, etc.)"
+    "\n'Attendees'"
+    "\n'Discussion Summary'"
+    "\n'Decisions Made'"
+    "\n'Action Items'"
+    "\n'Next Meeting' (if applicable)"
+    "\n4. Content Transformation:"
+    "\n  - Condense conversational exchanges into concise discussion points."
+    "\n  - Clearly delineate decisions and action items."
+    "\n  - Ensure all responsibilities and due dates for action items are explicit."
+    "\n  - CRITICAL: Identify and REMOVE all email addresses from the output. Ensure they are not present in the 'Attendees' list or any other section of the reformatted minutes."
+    "\n5. Formatting:"
+    "\n  - Use bullet points for lists (e.g., attendees, discussion points, action items)."
+    "\n  - Ensure distinct paragraphs using double newlines for proper vertical spacing."
+    "\n  - For all bulleted or sub-items, use exactly 4 spaces for indentation."
+    "\n6. Tone & Style:"
+    "\n  - Maintain a neutral, objective, and formal tone throughout."
+    "\n  - Avoid any conversational filler, slang, or subjective commentary."
+    # "\n  - CRITICAL: Output MUST be plain text. Do NOT use any Markdown formatting (e.g., no asterisks for bolding, hash symbols for headings, backticks for code blocks). Use only natural line breaks and spaces for formatting."
+    # "\n  - CRITICAL: Do NOT include any email-specific framing (e.g., 'Dear Team', 'Here are the minutes', 'Best regards', 'Subject:'). Provide only the reformatted meeting minutes content."
+)
+
+MINUTES_PROMPT = (
+    MINUTES_GUIDELINES
+    + "\n\nHere are the raw meeting notes to be transformed into professional minutes:\n{minutes}"
+)
+
+# One request for everything: the same guidelines, answered as JSON matching MINUTES_RECORD_SCHEMA.
+COMBINED_PROMPT = (
+    MINUTES_GUIDELINES
+    + "\n\nRespond with a single JSON object with these fields:"
+    "\n  - subject: an appropriate email subject title for the meeting, less than 5 words."
+    "\n  - minutes: the complete reformatted minutes as plain text, following the guidelines above."
+    "\n  - action_items: every action item as an object with task, owner and due (empty string if unknown)."
+    "\n  - attendees: the attendee names, without email addresses."
+    "\n\nHere are the raw meeting notes to be transformed into professional minutes:\n{minutes}"
+)
+
+# Incremental update of earlier minutes after a small edit to the notes; see revisions.py.
+REVISE_PROMPT = (
+    "You previously turned raw meeting notes into the professional meeting minutes below. "
+    "The notes have since been edited. Update the minutes so they reflect the edits and nothing else."
+    "\n\nRules:"
+    "\n  - Return only the sections that must change, each with its exact heading from the minutes "
+    "and the complete new text of that section (without the heading)."
+    "\n  - Use a new heading only if the edits need a section the minutes do not have."
+    "\n  - Keep the existing formatting: bullet points, exactly 4 spaces of indentation, a neutral formal tone."
+    "\n  - CRITICAL: Do not include any email addresses."
+    "\n\nCurrent minutes:\n{minutes}"
+    "\n\nEdits to the notes (each passage shown before and after the edit):\n{changes}"
+)
+
+REVISION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "sections": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "heading": {"type": "STRING"},
+                    "text": {"type": "STRING"},
+                },
+                "required": ["heading", "text"],
+            },
+        },
+    },
+    "required": ["sections"],
+}
+
+MINUTES_RECORD_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "subject": {"type": "STRING"},
+        "minutes": {"type": "STRING"},
+        "action_items": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "task": {"type": "STRING"},
+                    "owner": {"type": "STRING"},
+                    "due": {"type": "STRING"},
+                },
+                "required": ["task"],
+            },
+        },
+        "attendees": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["subject", "minutes", "action_items", "attendees"],
+    "propertyOrdering": ["subject", "minutes", "action_items", "attendees"],
+}
+
+CHUNK_PROMPT = (
+    "The following is part {index} of {total} of a long meeting transcript. Parts overlap slightly."
+    "\nWrite concise factual notes for this part only, preserving every attendee name, date, time, "
+    "location, discussion point, decision and action item (with owner and due date). "
+    "Do not add commentary, headings for the whole meeting, or information not present in the text."
+    "\n\n{chunk}"
+)
+
+DEFAULT_TEMPLATES = {
+    # A title for short notes doesn't need pro or thinking; long transcripts still get both.
+    "subject": PromptTemplate("subject", SUBJECT_PROMPT, tiers=[
+        (4000, "gemini-2.5-flash", 0),
+        (None, "gemini-2.5-pro", 500),
+    ], temperature=0.2),
+    "minutes": PromptTemplate("minutes", MINUTES_PROMPT, tiers=[
+        (2000, "gemini-2.5-flash", 0),
+        (None, "gemini-2.5-flash", 500),
+    ], temperature=0.3, chunk_above_tokens=LONG_INPUT_THRESHOLD // CHARS_PER_TOKEN),
+    "combined": PromptTemplate("combined", COMBINED_PROMPT, tiers=[
+        (2000, "gemini-2.5-flash", 0),
+        (None, "gemini-2.5-flash", 500),
+    ], temperature=0.3, chunk_above_tokens=LONG_INPUT_THRESHOLD // CHARS_PER_TOKEN),
+    "revise": PromptTemplate("revise", REVISE_PROMPT, tiers=[
+        (4000, "gemini-2.5-flash", 0),
+        (None, "gemini-2.5-flash", 500),
+    ], temperature=0.2),
+    "chunk": PromptTemplate("chunk", CHUNK_PROMPT, tiers=[
+        (None, "gemini-2.5-flash", 0),
+    ], temperature=0.2),
+}
+
+
+# --- Registry ---
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def load_registry(path=LLM_PROMPTS_PATH):
+    """Built-in templates with any overrides from the JSON file at path applied."""
+    registry = dict(DEFAULT_TEMPLATES)
+    if not path or not os.path.exists(path):
+        return registry
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        for name, entry in overrides.items():
+            if name in registry:
+                registry[name] = registry[name].with_overrides(entry)
+            else:
+                registry[name] = PromptTemplate(name, entry["text"], entry["tiers"],
+                                                entry.get("temperature", 0.2), entry.get("chunk_above_tokens"))
+        print(f"✅ Loaded prompt settings from {path}.")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Ignoring prompt settings in {path}: {type(e).__name__}: {e}")
+        return dict(DEFAULT_TEMPLATES)
+    return registry
+
+
+def get_template(name):
+    """Returns a registered template; the registry is loaded on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_registry()
+    return _registry[name]
+
+
+def set_registry(registry):
+    """Replaces the registry (a {name: PromptTemplate} dict), e.g. to pin models in tests."""
+    global _registry
+    with _registry_lock:
+        _registry = dict(registry)
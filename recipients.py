@@ -0,0 +1,326 @@
+"""
+Recipient directory: turns extracted and hand-typed addresses into one
+normalized, validated, duplicate-free recipient list.
+
+    directory = get_directory()
+    accepted, rejected = directory.resolve(["Alice@X.com", "eng-team", "bob@typo.invalid"])
+
+Addresses are case-folded so `Alice@X.com` and `alice@x.com` are one
+recipient. Entries naming an alias or distribution list are expanded from a
+local alias file (RECIPIENT_ALIASES_PATH), one list per line:
+
+    # name: members
+    eng-team: alice@example.com, bob@example.com
+    all-hands@example.com: eng-team, carol@example.com
+
+Each address is syntax-checked and its domain must accept mail (MX, or an
+A/AAAA record as the implicit MX). Domain answers are cached, so a long
+attendee list costs one lookup per distinct domain. Lookups need dnspython;
+without it (the system resolver can't see MX records) only the syntax check
+applies. Lookup errors other than "no such domain" are treated as valid so
+an offline machine never drops mail. Pass a LocalResolver to resolve without
+touching the network.
+"""
+import concurrent.futures
+import os
+import re
+import threading
+import time
+from email.utils import parseaddr
+
+from config import load_config
+
+load_config()
+
+RECIPIENT_ALIASES_PATH = os.getenv("RECIPIENT_ALIASES_PATH", os.path.join(os.path.expanduser("~"), ".meeting_dispatcher", "aliases.txt"))
+RECIPIENT_CHECK_DOMAINS = os.getenv("RECIPIENT_CHECK_DOMAINS", "1") not in ("", "0", "false", "no")
+DOMAIN_LOOKUP_TIMEOUT = float(os.getenv("RECIPIENT_DNS_TIMEOUT", "3"))  # seconds per domain
+DOMAIN_CACHE_TTL = int(os.getenv("RECIPIENT_DOMAIN_CACHE_TTL", str(24 * 3600)))  # seconds
+DOMAIN_LOOKUP_PARALLELISM = 8
+MAX_ALIAS_DEPTH = 10
+
+# Pragmatic RFC 5322 subset: dot-atom local part, dotted domain with a 2+ letter TLD.
+_ADDRESS_RE = re.compile(
+    r"^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}$"
+)
+_STRIP_CHARS = " \t\r\n<>\"'()[],;:."
+
+REJECT_SYNTAX = "invalid address"
+REJECT_DOMAIN = "domain does not accept mail"
+REJECT_ALIAS_LOOP = "alias loop"
+
+
+def normalize_address(entry):
+    """
+    Returns the case-folded bare address for 'a@b.com', 'Alice <a@b.com>' or
+    'mailto:a@b.com', or None when the entry has no address in it.
+    """
+    if not entry:
+        return None
+    entry = entry.strip()
+    if "<" in entry or " " in entry or '"' in entry:
+        _, entry = parseaddr(entry)
+    address = entry.strip(_STRIP_CHARS).casefold()
+    if address.startswith("mailto:"):
+        address = address[len("mailto:"):]
+    return address if "@" in address else None
+
+
+def is_valid_syntax(address):
+    """Checks a normalized address against the accepted address syntax."""
+    return len(address) <= 254 and _ADDRESS_RE.match(address) is not None
+
+
+def load_alias_file(path):
+    """Reads 'name: member, member' lines into {name: [members]}; a missing file yields {}."""
+    aliases = {}
+    if not path or not os.path.exists(path):
+        return aliases
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                name, sep, members = line.partition(":")
+                if not sep or not name.strip():
+                    print(f"⚠️ Ignoring malformed alias line {line_number} in {path}.")
+                    continue
+                key = name.strip().casefold()
+                aliases.setdefault(key, []).extend(m.strip() for m in members.split(",") if m.strip())
+    except OSError as e:
+        print(f"⚠️ Could not read alias file {path}: {e}")
+    return aliases
+
+
+# --- Domain Resolvers ---
+
+class LocalResolver:
+    """Resolver stand-in: only the given domains accept mail. Counts lookups for tests and benchmarks."""
+
+    def __init__(self, valid_domains=()):
+        self.valid_domains = {d.casefold() for d in valid_domains}
+        self.lookups = 0
+        self._lock = threading.Lock()  # domains are looked up concurrently
+
+    def __call__(self, domain):
+        with self._lock:
+            self.lookups += 1
+        return domain in self.valid_domains
+
+
+_dnspython_missing_reported = False
+
+
+def dns_resolver(domain, timeout=DOMAIN_LOOKUP_TIMEOUT):
+    """
+    True if the domain can receive mail. Uses dnspython (MX, then A); only a
+    definite "no such domain" answer returns False. Without dnspython every
+    domain is accepted: getaddrinfo only sees A/AAAA records, so it would
+    reject domains that receive mail through MX records alone.
+    """
+    global _dnspython_missing_reported
+    try:
+        import dns.resolver
+        import dns.exception
+    except ImportError:
+        if not _dnspython_missing_reported:
+            _dnspython_missing_reported = True
+            print("⚠️ dnspython is not installed; recipient domains are not checked (syntax only).")
+        return True
+
+    try:
+        dns.resolver.resolve(domain, "MX", lifetime=timeout)
+        return True
+    except dns.resolver.NXDOMAIN:
+        return False
+    except dns.resolver.NoAnswer:
+        pass
+    except dns.exception.DNSException:
+        return True
+    try:
+        dns.resolver.resolve(domain, "A", lifetime=timeout)
+        return True
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        return False
+    except dns.exception.DNSException:
+        return True
+
+
+# --- Recipient Index ---
+
+class RecipientIndex:
+    """Ordered set of normalized addresses with O(1) membership; remembers where each came from."""
+
+    def __init__(self, addresses=(), source=""):
+        self._entries = {}  # address -> source
+        for address in addresses:
+            self.add(address, source)
+
+    def add(self, address, source=""):
+        """Adds a normalized address; returns False if it was already present."""
+        if address in self._entries:
+            return False
+        self._entries[address] = source
+        return True
+
+    def discard(self, address):
+        self._entries.pop(address, None)
+
+    def source_of(self, address):
+        return self._entries.get(address)
+
+    def addresses(self):
+        return list(self._entries)
+
+    def __contains__(self, address):
+        return address in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- Recipient Directory ---
+
+class RecipientDirectory:
+    """
+    Expands aliases, normalizes, validates and deduplicates recipients. The
+    per-domain validity cache is shared across calls and threads.
+    """
+
+    def __init__(self, aliases=None, resolver=None, check_domains=True,
+                 cache_ttl=DOMAIN_CACHE_TTL, lookup_timeout=DOMAIN_LOOKUP_TIMEOUT):
+        self.aliases = {name.casefold(): list(members) for name, members in (aliases or {}).items()}
+        self.resolver = resolver or dns_resolver
+        self.check_domains = check_domains
+        self.cache_ttl = cache_ttl
+        self.lookup_timeout = lookup_timeout
+        self._domains = {}  # domain -> (checked_at, accepts_mail)
+        self._lock = threading.Lock()
+
+    def expand(self, entry):
+        """
+        Returns (addresses, problems) for one entry: an alias expands
+        recursively to its members, anything else is normalized in place.
+        """
+        addresses, problems = [], {}
+        self._expand(entry, addresses, problems, set(), 0)
+        return addresses, problems
+
+    def _expand(self, entry, addresses, problems, seen, depth):
+        address = normalize_address(entry)
+        key = address or entry.strip().casefold()
+        members = self.aliases.get(key) if self.aliases else None
+        if members is None or (address is not None and key in seen):
+            # A plain address, or a list that names its own mailbox as a member.
+            if address is None or not is_valid_syntax(address):
+                problems[entry.strip()] = REJECT_SYNTAX
+            else:
+                addresses.append(address)
+            return
+        if key in seen or depth >= MAX_ALIAS_DEPTH:
+            problems[entry.strip()] = REJECT_ALIAS_LOOP
+            return
+        seen.add(key)
+        for member in members:
+            self._expand(member, addresses, problems, seen, depth + 1)
+        seen.discard(key)
+
+    def domain_accepts_mail(self, domain):
+        """Cached resolver answer for one domain; a lookup that times out counts as valid."""
+        now = time.time()
+        with self._lock:
+            cached = self._domains.get(domain)
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            return cached[1]
+        accepts = _lookup_with_timeout(self.resolver, domain, self.lookup_timeout)
+        with self._lock:
+            self._domains[domain] = (now, accepts)
+        return accepts
+
+    def _check_domains(self, domains):
+        """Looks up the given domains concurrently; returns the set that rejected mail."""
+        domains = list(domains)
+        if len(domains) == 1:
+            return set() if self.domain_accepts_mail(domains[0]) else set(domains)
+        workers = min(DOMAIN_LOOKUP_PARALLELISM, len(domains)) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mx") as executor:
+            answers = executor.map(self.domain_accepts_mail, domains)
+            return {domain for domain, accepts in zip(domains, answers) if not accepts}
+
+    def resolve(self, entries, source="", exclude=()):
+        """
+        Resolves entries (addresses, 'Name <address>' strings or alias names)
+        into (RecipientIndex, {entry: reason}) of accepted and rejected
+        recipients. Addresses in `exclude` are silently left out.
+        """
+        excluded = {a for a in (normalize_address(e) for e in exclude) if a}
+        index = RecipientIndex()
+        rejected = {}
+        for entry in entries:
+            addresses, problems = self.expand(entry)
+            rejected.update(problems)
+            for address in addresses:
+                if address not in excluded:
+                    index.add(address, source)
+
+        if self.check_domains and len(index):
+            domains = {address.rsplit("@", 1)[1] for address in index}
+            bad_domains = self._check_domains(domains)
+            for address in index.addresses():
+                if address.rsplit("@", 1)[1] in bad_domains:
+                    index.discard(address)
+                    rejected[address] = REJECT_DOMAIN
+        return index, rejected
+
+    def domain_cache_stats(self):
+        with self._lock:
+            return {
+                "domains": len(self._domains),
+                "rejecting": sum(1 for _, accepts in self._domains.values() if not accepts),
+            }
+
+
+def _lookup_with_timeout(resolver, domain, timeout):
+    # getaddrinfo has no timeout of its own, so the lookup runs on a helper thread.
+    result = []
+    worker = threading.Thread(target=lambda: result.append(_safe_lookup(resolver, domain)), daemon=True)
+    worker.start()
+    worker.join(timeout)
+    return result[0] if result else True
+
+
+def _safe_lookup(resolver, domain):
+    try:
+        return bool(resolver(domain))
+    except Exception as e:
+        print(f"⚠️ Domain lookup for {domain} failed ({type(e).__name__}: {e}); accepting it.")
+        return True
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_directory():
+    """The shared directory, built on first use from RECIPIENT_ALIASES_PATH."""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = RecipientDirectory(
+                    aliases=load_alias_file(RECIPIENT_ALIASES_PATH),
+                    check_domains=RECIPIENT_CHECK_DOMAINS,
+                )
+    return _directory
+
+
+def set_directory(directory):
+    """Replaces the shared directory (e.g. one built with a LocalResolver for tests)."""
+    global _directory
+    with _directory_lock:
+        _directory = directory
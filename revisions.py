@@ -0,0 +1,155 @@
+"""
+Diff-aware regeneration support: finds what changed between two versions of
+the (cleaned) meeting notes and splices revised sections into previously
+generated minutes.
+
+Cleaned notes are a single line of text, so changes are tracked per
+sentence. Generated minutes are split into sections at their headings
+('Meeting Details', 'Attendees', ... or markdown '#' headings). A small edit
+then costs one short request that rewrites only the affected sections,
+instead of a full regeneration from the raw notes.
+
+RevisionStore remembers recent (notes, output) pairs for the session and
+finds the closest earlier version of new notes.
+"""
+import collections
+import difflib
+import re
+import threading
+
+INCREMENTAL_MAX_CHANGE = 0.3   # above this fraction of changed text, regenerate in full
+CONTEXT_SENTENCES = 1          # unchanged sentences shown around each edit
+MAX_REMEMBERED_RUNS = 16
+
+KNOWN_HEADINGS = (
+    "meeting details",
+    "attendees",
+    "discussion summary",
+    "decisions made",
+    "action items",
+    "next meeting",
+)
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?;:])\s+')
+_MARKDOWN_HEADING_RE = re.compile(r'^#{1,6}\s+\S')
+
+Section = collections.namedtuple("Section", ["heading", "body"])
+
+
+def split_sentences(text):
+    """Splits whitespace-normalized text into sentence-like units."""
+    return [s for s in _SENTENCE_END_RE.split(text) if s]
+
+
+def diff_notes(old_text, new_text, context=CONTEXT_SENTENCES):
+    """
+    Compares two versions of the notes sentence by sentence. Returns
+    (changes, changed_fraction): changes is a list of (before, after)
+    passages, each padded with `context` unchanged sentences.
+    """
+    old = split_sentences(old_text)
+    new = split_sentences(new_text)
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    changes = []
+    changed_chars = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changed_chars += max(sum(len(s) for s in old[i1:i2]), sum(len(s) for s in new[j1:j2]))
+        before = " ".join(old[max(0, i1 - context):min(len(old), i2 + context)])
+        after = " ".join(new[max(0, j1 - context):min(len(new), j2 + context)])
+        changes.append((before, after))
+    total = max(len(old_text), len(new_text), 1)
+    return changes, changed_chars / total
+
+
+def _heading_key(line):
+    stripped = line.strip()
+    if not stripped or line[:1].isspace() or stripped[:1] in "-*•":
+        return None
+    key = stripped.lstrip("#").strip().rstrip(":").strip().casefold()
+    if key in KNOWN_HEADINGS or _MARKDOWN_HEADING_RE.match(stripped):
+        return key
+    return None
+
+
+def split_sections(minutes):
+    """
+    Splits generated minutes into Sections. Text before the first heading
+    becomes a section with heading None. Returns [] if there are no headings.
+    """
+    sections = []
+    heading, body = None, []
+    for line in minutes.split("\n"):
+        if _heading_key(line) is not None:
+            if heading is not None or any(part.strip() for part in body):
+                sections.append(Section(heading, "\n".join(body)))
+            heading, body = line, []
+        else:
+            body.append(line)
+    sections.append(Section(heading, "\n".join(body)))
+    return sections if any(section.heading for section in sections) else []
+
+
+def splice_sections(minutes, revised):
+    """
+    Replaces the bodies of the sections named in `revised` ({heading: text})
+    and appends sections the minutes did not have yet. Returns the new
+    minutes, or None if the minutes have no recognisable sections.
+    """
+    sections = split_sections(minutes)
+    if not sections:
+        return None
+    pending = {heading.strip().lstrip("#").strip().rstrip(":").strip().casefold(): (heading, text)
+               for heading, text in revised.items()}
+    parts = []
+    for section in sections:
+        key = _heading_key(section.heading) if section.heading else None
+        if key in pending:
+            _, text = pending.pop(key)
+            body = "\n" + text.strip("\n") + "\n"
+        else:
+            body = section.body
+        parts.append(body if section.heading is None else section.heading + "\n" + body)
+    for heading, text in pending.values():
+        parts.append("\n" + heading.strip() + "\n\n" + text.strip("\n"))
+    return "\n".join(parts).strip()
+
+
+class RevisionStore:
+    """Recent (notes, record) pairs for this session; finds the closest earlier version of new notes."""
+
+    def __init__(self, max_entries=MAX_REMEMBERED_RUNS, max_change=INCREMENTAL_MAX_CHANGE):
+        self.max_change = max_change
+        self._runs = collections.OrderedDict()  # notes -> record
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def remember(self, notes, record):
+        with self._lock:
+            self._runs.pop(notes, None)
+            self._runs[notes] = dict(record)
+            while len(self._runs) > self._max_entries:
+                self._runs.popitem(last=False)
+
+    def find_base(self, notes):
+        """
+        Returns (previous_record, changes) for the most recent earlier version
+        that differs from notes by at most max_change, or None.
+        """
+        with self._lock:
+            runs = list(self._runs.items())
+        for previous_notes, record in reversed(runs):
+            if previous_notes == notes:
+                continue
+            shorter, longer = sorted((len(previous_notes), len(notes)))
+            if longer and shorter / longer < 1 - self.max_change:
+                continue
+            changes, changed = diff_notes(previous_notes, notes)
+            if changes and changed <= self.max_change:
+                return record, changes
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
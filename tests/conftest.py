@@ -0,0 +1,16 @@
+"""
+Test setup: the modules read credentials and paths from the environment at
+import time, so safe placeholders are set before any of them is imported.
+Nothing here talks to Gemini, DNS or a real SMTP server.
+"""
+import os
+import sys
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("SENDER_EMAIL", "sender@example.com")
+os.environ.setdefault("GMAIL_PASSWORD", "test-password")
+os.environ["LLM_CACHE_PATH"] = ""           # in-memory LLM cache only
+os.environ["RECIPIENT_CHECK_DOMAINS"] = "0"
+os.environ["LLM_PROMPTS_PATH"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,44 @@
+import threading
+
+from llm_service import split_into_chunks
+
+
+def _split(*args):
+    # Run in a thread so a regression fails the test instead of hanging the suite.
+    result = []
+    worker = threading.Thread(target=lambda: result.append(split_into_chunks(*args)), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert result, "split_into_chunks did not terminate"
+    return result[0]
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("a few words", chunk_size=50, overlap=10) == ["a few words"]
+
+
+def test_cut_at_window_midpoint_still_advances():
+    # overlap == chunk_size // 2 and the only space sits at the window's midpoint, so the
+    # cut eats the whole overlap; this used to restart at the same offset forever.
+    text = "aaaaa " + "b" * 40
+    chunks = _split(text, 10, 5)
+    assert chunks[0] == "aaaaa"
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert chunks[-1].endswith("b") and "".join(chunks).count("a") == 5
+
+
+def test_text_without_whitespace_is_cut_hard():
+    text = "".join(chr(ord("a") + i % 26) for i in range(95))
+    chunks = _split(text, 10, 5)
+    assert all(len(chunk) == 10 for chunk in chunks[:-1])
+    assert chunks[0] == text[:10] and chunks[1] == text[5:15]  # consecutive chunks overlap by 5
+    assert text.endswith(chunks[-1])
+    assert len(chunks) == 18
+
+
+def test_chunks_cover_every_word():
+    words = [f"w{i}" for i in range(500)]
+    chunks = _split(" ".join(words), 200, 50)
+    # Chunks end on whitespace; only the overlap at their start may begin mid-word.
+    assert set(words) <= set(" ".join(chunks).split())
+    assert all(len(chunk) <= 200 for chunk in chunks)
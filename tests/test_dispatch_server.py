@@ -0,0 +1,63 @@
+import pytest
+
+import dispatch_server
+from dispatch_events import DispatchEvent, EVENT_DRAFT, EVENT_SENT
+from dispatch_server import DispatchService, HTTPError, STATE_READY, STATE_SENT, STATE_CANCELLED
+
+
+class FakeEngine:
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel(self, job_id):
+        self.cancelled.append(job_id)
+
+
+DRAFT = {"subject": "Sync", "minutes": "m", "body": "b", "to": "a@example.com", "cc": ["b@example.com"]}
+
+
+def _ready(service, job_id, age=0):
+    service._apply_event(DispatchEvent(job_id, EVENT_DRAFT, DRAFT))
+    service._records[job_id]["updated_at"] -= age
+
+
+def test_unsent_drafts_expire_and_release_their_jobs(monkeypatch):
+    monkeypatch.setattr(dispatch_server, "SERVICE_READY_TTL", 60)
+    engine = FakeEngine()
+    service = DispatchService(engine)
+    _ready(service, 1, age=120)
+    _ready(service, 2)
+    service._evict()
+    assert engine.cancelled == [1]
+    assert service.get(1)["state"] == STATE_CANCELLED and "expired" in service.get(1)["error"]
+    assert service.get(2)["state"] == STATE_READY
+
+
+def test_expired_drafts_are_evicted_when_full(monkeypatch):
+    monkeypatch.setattr(dispatch_server, "SERVICE_READY_TTL", 60)
+    monkeypatch.setattr(dispatch_server, "SERVICE_MAX_RECORDS", 2)
+    engine = FakeEngine()
+    service = DispatchService(engine)
+    for job_id in (1, 2):
+        _ready(service, job_id, age=120)
+    service._apply_event(DispatchEvent(3, EVENT_SENT, True))
+    assert list(service._records) == [2, 3]
+    assert service.get(3)["state"] == STATE_SENT
+    assert engine.cancelled == [1, 2]
+
+
+@pytest.mark.parametrize("authorization", [None, "", "Bearer wrong", "Bearer secret ", "Bearer sécret"])
+def test_bad_tokens_are_rejected(authorization):
+    service = DispatchService(FakeEngine(), token="secret")
+    headers = {} if authorization is None else {"authorization": authorization}
+    with pytest.raises(HTTPError) as error:
+        service.route("GET", "/health", headers, b"")
+    assert error.value.status == 401
+
+
+def test_matching_token_is_accepted(monkeypatch):
+    monkeypatch.setattr(dispatch_server, "get_cache_stats", lambda: {})
+    monkeypatch.setattr(dispatch_server, "get_resilience_state", lambda: {})
+    service = DispatchService(FakeEngine(), token="secret")
+    status, payload = service.route("GET", "/health", {"authorization": "Bearer secret"}, b"")
+    assert status == 200 and payload["status"] == "ok"
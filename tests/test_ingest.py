@@ -0,0 +1,124 @@
+import codecs
+
+import pytest
+
+from ingest import detect_encoding, iter_file_text, iter_text_file, iter_transcript_cues, read_file_content
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data.encode("utf-8") if isinstance(data, str) else data)
+    return str(path)
+
+
+def _cues(path):
+    return [cue.strip() for cue in iter_transcript_cues(path)]
+
+
+# --- VTT / SRT cues ---
+
+def test_vtt_text_ids_are_dropped(tmp_path):
+    path = _write(tmp_path, "call.vtt", """WEBVTT
+
+intro
+00:00:01.000 --> 00:00:04.000
+<v Alice>Welcome, everyone.
+
+budget-2
+00:00:05.000 --> 00:00:08.000 align:start
+<v.loud Bob>Budget is <b>approved</b>.
+""")
+    assert _cues(path) == ["Alice: Welcome, everyone.", "Bob: Budget is approved."]
+
+
+def test_vtt_cues_without_ids(tmp_path):
+    path = _write(tmp_path, "call.vtt", "WEBVTT\n\n00:01.000 --> 00:02.000\nShort timing form.\n")
+    assert _cues(path) == ["Short timing form."]
+
+
+def test_srt_numeric_first_text_line_is_kept(tmp_path):
+    path = _write(tmp_path, "call.srt", """1
+00:00:01,000 --> 00:00:03,000
+2024
+was a good year.
+
+2
+00:00:04,000 --> 00:00:06,000
+42
+""")
+    assert _cues(path) == ["2024 was a good year.", "42"]
+
+
+def test_notes_styles_and_headers_are_skipped(tmp_path):
+    path = _write(tmp_path, "call.vtt", """WEBVTT - Weekly sync
+
+NOTE This cue was
+spoken off the record.
+
+STYLE
+::cue { color: red }
+
+REGION
+id:speaker
+
+1
+00:00:01.000 --> 00:00:02.000
+On the record.
+""")
+    assert _cues(path) == ["On the record."]
+
+
+def test_crlf_line_endings(tmp_path):
+    path = _write(tmp_path, "call.srt",
+                  "1\r\n00:00:01,000 --> 00:00:02,000\r\nFirst line\r\nsecond line\r\n\r\n"
+                  "2\r\n00:00:03,000 --> 00:00:04,000\r\nNext cue\r\n")
+    assert _cues(path) == ["First line second line", "Next cue"]
+
+
+def test_text_without_timings_is_kept(tmp_path):
+    # A block with no timing line has no cue id either: its first line is text.
+    path = _write(tmp_path, "notes.vtt", "Agenda\nItem one\n\nClosing remark")
+    assert _cues(path) == ["Agenda Item one", "Closing remark"]
+
+
+def test_transcripts_are_dispatched_by_extension(tmp_path):
+    path = _write(tmp_path, "CALL.SRT", "1\n00:00:01,000 --> 00:00:02,000\nHello\n")
+    assert "".join(iter_file_text(path)) == "Hello\n"
+
+
+# --- Encoding detection ---
+
+@pytest.mark.parametrize("bom, codec, encoding", [
+    (codecs.BOM_UTF8, "utf-8", "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le", "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16-be", "utf-16"),
+    (codecs.BOM_UTF32_LE, "utf-32-le", "utf-32"),
+])
+def test_bom_selects_encoding(tmp_path, bom, codec, encoding):
+    text = "Café notes — ünïcode"
+    data = bom + text.encode(codec)
+    assert detect_encoding(data) == encoding
+    path = _write(tmp_path, "notes.txt", data)
+    assert "".join(iter_text_file(path, block_size=3)) == text
+
+
+def test_utf8_without_bom(tmp_path):
+    text = "naïve café " * 10
+    path = _write(tmp_path, "notes.txt", text)
+    # Tiny blocks split multi-byte characters; the incremental decoder rejoins them.
+    assert "".join(iter_text_file(path, block_size=1)) == text
+
+
+def test_cp1252_fallback(tmp_path):
+    data = "Caf\xe9 – “quoted”".encode("cp1252")
+    assert detect_encoding(data) == "cp1252"
+    path = _write(tmp_path, "notes.txt", data)
+    assert "".join(iter_text_file(path)) == "Caf\xe9 – “quoted”"
+
+
+def test_utf8_cut_at_sniff_boundary_is_still_utf8():
+    assert detect_encoding("é".encode("utf-8")[:1]) == "utf-8"
+
+
+def test_read_file_content_missing_file(tmp_path):
+    assert read_file_content(str(tmp_path / "missing.txt")) is None
@@ -0,0 +1,246 @@
+import threading
+import time
+
+import pytest
+
+import batch_dispatch
+import dispatch_engine
+import job_queue
+from job_queue import (
+    JobQueue,
+    JobWorkerPool,
+    STATE_INGESTED,
+    STATE_SUMMARIZED,
+    STATE_PREVIEWED,
+    STATE_SENDING,
+    STATE_SENT,
+    STATE_CANCELLED,
+    STATE_FAILED,
+    MAX_SEND_ATTEMPTS,
+    send_job,
+)
+from llm_service import LLMUnavailableError, SUBJECT_FALLBACK
+
+NOTES = "Weekly sync. Alice agreed to ship on Friday. Bob owns the docs."
+TO = "sender@example.com"
+CC = ["alice@example.com", "bob@example.com"]
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite"))
+
+
+def _report(delivered=(), failed=None):
+    return {"delivered": list(delivered), "refused": {}, "failed": dict(failed or {}), "batches": 1}
+
+
+def _previewed(jobs):
+    job = jobs.enqueue(NOTES, TO, CC)
+    jobs.mark_summarized(job["id"], "Weekly Sync", "Meeting Details\n\n    - shipped")
+    jobs.mark_previewed(job["id"])
+    return jobs.get(job["id"])
+
+
+# --- State transitions ---
+
+def test_happy_path_transitions(jobs):
+    job = jobs.enqueue(NOTES, TO, CC)
+    assert job["state"] == STATE_INGESTED and job["minutes"] is None
+    assert jobs.mark_summarized(job["id"], "Weekly Sync", "minutes")
+    assert jobs.get(job["id"])["state"] == STATE_SUMMARIZED
+    assert jobs.mark_previewed(job["id"])
+    assert jobs.begin_send(job["id"])
+    assert jobs.get(job["id"])["state"] == STATE_SENDING
+    assert not jobs.begin_send(job["id"])  # a second sender loses
+    assert jobs.mark_sent(job["id"])
+    assert jobs.get(job["id"])["state"] == STATE_SENT
+
+
+def test_transitions_require_expected_state(jobs):
+    job = jobs.enqueue(NOTES, TO, CC)
+    assert not jobs.begin_send(job["id"])  # not previewed yet
+    assert not jobs.mark_sent(job["id"])
+    jobs.mark_summarized(job["id"], "s", "m")
+    assert not jobs.mark_summarized(job["id"], "other", "other")  # already summarized
+    assert jobs.get(job["id"])["subject"] == "s"
+
+
+def test_enqueue_is_idempotent(jobs):
+    first = jobs.enqueue(NOTES, TO, CC)
+    again = jobs.enqueue(NOTES, TO.upper(), list(reversed(CC)))
+    assert again["id"] == first["id"]
+    assert jobs.enqueue(NOTES, TO, CC + ["carol@example.com"])["id"] != first["id"]
+
+
+def test_sent_job_is_not_reopened(jobs):
+    job = _previewed(jobs)
+    jobs.begin_send(job["id"])
+    jobs.mark_sent(job["id"])
+    assert jobs.enqueue(NOTES, TO, CC)["state"] == STATE_SENT
+
+
+def test_cancelled_job_reopens_with_stored_output(jobs):
+    job = jobs.enqueue(NOTES, TO, CC)
+    jobs.mark_summarized(job["id"], "Weekly Sync", "minutes")
+    jobs.mark_cancelled(job["id"])
+    assert jobs.get(job["id"])["state"] == STATE_CANCELLED
+    reopened = jobs.enqueue(NOTES, TO, CC)
+    assert reopened["state"] == STATE_SUMMARIZED
+    assert reopened["subject"] == "Weekly Sync"
+
+
+def test_reopen_drops_stored_fallback_output(jobs):
+    # Queues written by older versions may hold the error fallback; it must not be reused.
+    job = jobs.enqueue(NOTES, TO, CC)
+    jobs.mark_summarized(job["id"], SUBJECT_FALLBACK, NOTES)
+    jobs.mark_cancelled(job["id"])
+    reopened = jobs.enqueue(NOTES, TO, CC)
+    assert reopened["state"] == STATE_INGESTED
+    assert reopened["subject"] is None and reopened["minutes"] is None
+
+
+def test_send_failures_retry_then_fail(jobs):
+    job = _previewed(jobs)
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        assert jobs.begin_send(job["id"])
+        jobs.mark_send_failed(job["id"], "SMTP send failed.")
+        expected = STATE_FAILED if attempt == MAX_SEND_ATTEMPTS else STATE_PREVIEWED
+        assert jobs.get(job["id"])["state"] == expected
+
+
+def test_partial_send_narrows_recipients(jobs, monkeypatch):
+    job = _previewed(jobs)
+    monkeypatch.setattr(job_queue, "deliver_email",
+                        lambda *a, **k: _report(["alice@example.com"], {"bob@example.com": "451"}))
+    assert not send_job(jobs, job)
+    job = jobs.get(job["id"])
+    assert job["state"] == STATE_PREVIEWED
+    assert job["cc"] == ["bob@example.com"]
+
+
+def test_recover_interrupted_fails_expired_sends(jobs):
+    job = _previewed(jobs)
+    jobs.begin_send(job["id"])
+    assert jobs.recover_interrupted() == 0  # lease still valid
+    jobs._update(job["id"], None, lease_until=time.time() - 1)
+    assert jobs.recover_interrupted() == 1
+    assert jobs.get(job["id"])["state"] == STATE_FAILED
+
+
+def test_claim_next_respects_leases_and_approval(jobs):
+    manual = jobs.enqueue(NOTES, TO, CC)
+    jobs.mark_summarized(manual["id"], "s", "m")                 # waits for a preview
+    auto = jobs.enqueue(NOTES + " auto", TO, CC, auto_approve=True)
+    jobs.mark_summarized(auto["id"], "s", "m")
+    leased = jobs.enqueue(NOTES + " leased", TO, CC, lease=True)  # caller is summarizing it
+    claimed = jobs.claim_next()
+    assert claimed["id"] == auto["id"]
+    assert jobs.claim_next() is None
+    assert leased["lease_until"] is not None
+
+
+# --- LLM failures never reach the queue ---
+
+def test_worker_pool_leaves_job_ingested_when_llm_fails(jobs, monkeypatch):
+    def unavailable(text, fallback=True):
+        assert fallback is False
+        raise LLMUnavailableError("down")
+    monkeypatch.setattr(job_queue, "get_llm_subject_and_minutes", unavailable)
+    job = jobs.enqueue(NOTES, TO, CC, auto_approve=True)
+    JobWorkerPool(jobs, workers=1).drain()  # returns instead of retrying in a loop
+    job = jobs.get(job["id"])
+    assert job["state"] == STATE_INGESTED
+    assert job["minutes"] is None
+    assert job["lease_until"] > time.time()
+
+
+def test_worker_pool_summarizes_and_sends_auto_approved(jobs, monkeypatch):
+    monkeypatch.setattr(job_queue, "get_llm_subject_and_minutes", lambda text, fallback=True: ("Sync", "minutes"))
+    sent = []
+    monkeypatch.setattr(job_queue, "deliver_email", lambda to, cc, *a, **k: sent.append(cc) or _report(cc))
+    job = jobs.enqueue(NOTES, TO, CC, auto_approve=True)
+    JobWorkerPool(jobs, workers=1).drain()
+    assert jobs.get(job["id"])["state"] == STATE_SENT
+    assert sent == [CC]
+
+
+def _next_outcome(engine):
+    while True:
+        event = engine.events.get(timeout=5)
+        if event.kind in ("draft", "failed"):
+            return event
+
+
+def test_engine_does_not_store_failed_generation(jobs, monkeypatch):
+    # Fail, cancel, then retry once Gemini is back: the retry must call the LLM again.
+    calls = []
+
+    def unavailable(text, fallback=True, revisions=None):
+        calls.append(fallback)
+        raise LLMUnavailableError("down")
+    monkeypatch.setattr(dispatch_engine, "get_llm_subject_and_minutes", unavailable)
+    engine = dispatch_engine.DispatchEngine(max_workers=1, job_queue=jobs)
+    raw = NOTES + " alice@example.com"
+    job_id = engine.submit(raw)
+    assert _next_outcome(engine).kind == "failed"
+    engine.cancel(job_id)
+    assert calls == [False]
+    [stored] = jobs.jobs_in((STATE_INGESTED,))
+    assert stored["minutes"] is None and stored["lease_until"] is None
+
+    monkeypatch.setattr(dispatch_engine, "get_llm_subject_and_minutes",
+                        lambda text, fallback=True, revisions=None: ("Weekly Sync", "Meeting Details\n\n    - shipped"))
+    engine.submit(raw)
+    draft = _next_outcome(engine)
+    assert draft.kind == "draft" and draft.data["subject"] == "Weekly Sync"
+    assert jobs.get(stored["id"])["state"] == STATE_SUMMARIZED
+    engine.shutdown()
+
+
+# --- Each tool has its own queue ---
+
+def test_tools_default_to_separate_queue_files():
+    paths = {job_queue.DISPATCH_QUEUE_PATH, job_queue.BATCH_QUEUE_PATH, job_queue.SERVICE_QUEUE_PATH}
+    assert len(paths) == 3
+
+
+def test_batch_queue_option_uses_batch_queue(tmp_path, monkeypatch):
+    (tmp_path / "notes.txt").write_text(NOTES, encoding="utf-8")
+    opened = []
+
+    class Opened(Exception):
+        pass
+
+    def record(path):
+        opened.append(path)
+        raise Opened()
+    monkeypatch.setattr(batch_dispatch, "JobQueue", record)
+    with pytest.raises(Opened):
+        batch_dispatch.main([str(tmp_path), "--queue"])
+    assert opened == [job_queue.BATCH_QUEUE_PATH]
+
+
+def test_batch_drain_leaves_gui_jobs_alone(tmp_path, monkeypatch):
+    gui_jobs = JobQueue(str(tmp_path / "gui.sqlite"))
+    batch_jobs = JobQueue(str(tmp_path / "batch.sqlite"))
+    gui_job = gui_jobs.enqueue(NOTES, TO, CC)
+    monkeypatch.setattr(job_queue, "get_llm_subject_and_minutes", lambda text, fallback=True: ("Sync", "minutes"))
+    JobWorkerPool(batch_jobs, workers=1).drain()
+    assert gui_jobs.get(gui_job["id"])["state"] == STATE_INGESTED
+
+
+@pytest.mark.parametrize("path", [":memory:", ""])
+def test_in_memory_queue_is_rejected(path):
+    # Each thread opens its own connection, so an in-memory queue would be empty on worker threads.
+    with pytest.raises(ValueError):
+        JobQueue(path)
+
+
+def test_queue_is_shared_across_threads(jobs):
+    job = jobs.enqueue(NOTES, TO, CC)
+    seen = []
+    worker = threading.Thread(target=lambda: seen.append(jobs.get(job["id"])["state"]))
+    worker.start()
+    worker.join()
+    assert seen == [STATE_INGESTED]
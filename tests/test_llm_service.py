@@ -0,0 +1,167 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import dispatch_engine
+import llm_service
+from bench_dispatch import FakeGenaiClient
+from job_queue import JobQueue, STATE_INGESTED
+from llm_service import LLMUnavailableError, stream_reformatted_minutes
+
+NOTES = "Weekly sync. Alice agreed to ship on Friday. Bob owns the docs. alice@example.com"
+
+
+class EmptyStreamClient(FakeGenaiClient):
+    """A blocked response: the stream finishes, but no chunk carries text."""
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.calls += 1
+        for _ in range(3):
+            chunk = self._response(contents, "")
+            chunk.text = None
+            yield chunk
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(fake):
+        monkeypatch.setattr(llm_service, "_client", fake)
+        llm_service._get_cache().clear()
+        return fake
+    yield install
+    llm_service._get_cache().clear()
+
+
+def test_empty_stream_is_a_failure_when_strict(client):
+    client(EmptyStreamClient(latency=0))
+    with pytest.raises(LLMUnavailableError):
+        list(stream_reformatted_minutes(NOTES, fallback=False))
+
+
+def test_empty_stream_falls_back_to_raw_notes(client):
+    client(EmptyStreamClient(latency=0))
+    assert "".join(stream_reformatted_minutes(NOTES)) == NOTES
+
+
+def test_streaming_engine_saves_no_empty_draft(client, tmp_path):
+    client(EmptyStreamClient(latency=0))
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite"))
+    engine = dispatch_engine.DispatchEngine(max_workers=1, stream_minutes=True, job_queue=jobs)
+    try:
+        engine.submit(NOTES)
+        while True:
+            event = engine.events.get(timeout=5)
+            if event.kind in ("draft", "failed"):
+                break
+        assert event.kind == "failed"
+        [job] = jobs.jobs_in((STATE_INGESTED,))
+        assert job["minutes"] is None
+    finally:
+        engine.shutdown()
+
+
+def test_reopen_ignores_empty_stored_minutes(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job = jobs.enqueue(NOTES, "a@example.com", ["b@example.com"])
+    jobs.mark_summarized(job["id"], "Weekly Sync", "")
+    jobs.mark_cancelled(job["id"])
+    reopened = jobs.enqueue(NOTES, "a@example.com", ["b@example.com"])
+    assert reopened["state"] == STATE_INGESTED and reopened["minutes"] is None
+
+
+# --- Only usable replies are cached ---
+
+class MalformedRecordClient(FakeGenaiClient):
+    """Answers structured requests with text that is not the requested JSON."""
+
+    def _text(self, model, contents, config=None):
+        if (config or {}).get("response_schema"):
+            return '{"subject": "Weekly Sync"'
+        return super()._text(model, contents, config)
+
+
+def test_empty_stream_is_not_replayed_from_cache(client, monkeypatch):
+    client(EmptyStreamClient(latency=0))
+    with pytest.raises(LLMUnavailableError):
+        list(stream_reformatted_minutes(NOTES, fallback=False))
+    monkeypatch.setattr(llm_service, "_client", FakeGenaiClient(latency=0, output_words=5))
+    assert "".join(stream_reformatted_minutes(NOTES, fallback=False)).startswith("Meeting Details")
+
+
+def test_empty_reply_is_not_cached(client, monkeypatch):
+    empty = FakeGenaiClient(latency=0)
+    empty._text = lambda model, contents, config=None: "  "
+    client(empty)
+    assert llm_service.generate_subject_with_llm(NOTES) == llm_service.SUBJECT_FALLBACK
+    monkeypatch.setattr(llm_service, "_client", FakeGenaiClient(latency=0))
+    assert llm_service.generate_subject_with_llm(NOTES) == "Weekly Project Sync"
+
+
+def test_malformed_record_is_not_cached(client, monkeypatch):
+    bad = client(MalformedRecordClient(latency=0))
+    assert llm_service.generate_minutes_record(NOTES) is None
+    assert llm_service.generate_minutes_record(NOTES) is None
+    assert bad.calls == 2  # asked again rather than replayed
+    monkeypatch.setattr(llm_service, "_client", FakeGenaiClient(latency=0))
+    assert llm_service.generate_minutes_record(NOTES)["subject"] == "Weekly Project Sync"
+
+
+def test_valid_record_is_served_from_cache(client):
+    fake = client(FakeGenaiClient(latency=0))
+    first = llm_service.generate_minutes_record(NOTES)
+    assert llm_service.generate_minutes_record(NOTES) == first
+    assert fake.calls == 1
+
+
+# --- Call budgets ---
+
+class DownClient(FakeGenaiClient):
+    """Every request fails with a retryable network error."""
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        raise ConnectionError("connection reset")
+
+
+@pytest.fixture
+def fresh_guards(monkeypatch):
+    # Keep these tests' failures away from the rest of the suite, and the breaker out of the way.
+    monkeypatch.setattr(llm_service, "_limiters", {})
+    monkeypatch.setattr(llm_service, "_breakers", {})
+    breaker = llm_service.CircuitBreaker
+    monkeypatch.setattr(llm_service, "CircuitBreaker", lambda: breaker(threshold=10 ** 6))
+
+
+def test_http_timeout_fits_in_the_call_budget():
+    assert llm_service.LLM_HTTP_TIMEOUT_MS <= llm_service.LLM_CALL_TIMEOUT * 1000
+
+
+def test_queue_wait_is_bounded(monkeypatch):
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(llm_service, "_llm_executor", pool)
+    monkeypatch.setattr(llm_service, "LLM_QUEUE_TIMEOUT", 0.2)
+    release = threading.Event()
+    busy = llm_service._submit_llm(5, release.wait)
+    ran = []
+    queued = llm_service._submit_llm(5, ran.append, "ran")
+    started = time.monotonic()
+    assert llm_service._result_or_fallback(queued, 5, "fallback", "Queued call") == "fallback"
+    assert time.monotonic() - started < 2
+    release.set()
+    busy.result(timeout=5)
+    pool.shutdown(wait=True)
+    assert ran == [] and queued.cancelled()
+
+
+def test_retries_stop_at_the_call_deadline(client, fresh_guards, monkeypatch):
+    down = client(DownClient(latency=0))
+    monkeypatch.setattr(llm_service, "LLM_MAX_ATTEMPTS", 100)
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_BASE", 0.05)
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_CAP", 0.1)
+    started = time.monotonic()
+    future = llm_service._submit_llm(0.5, llm_service.generate_subject_with_llm, NOTES)
+    assert future.result(timeout=10) == llm_service.SUBJECT_FALLBACK  # the worker itself gave up
+    assert time.monotonic() - started < 2
+    assert 1 <= down.calls < 100
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from llm_service import parse_minutes_record, SUBJECT_FALLBACK, is_fallback_record
+
+
+def _response(**fields):
+    data = {"subject": "Weekly Sync", "minutes": "Meeting Details\n\n    - shipped"}
+    data.update(fields)
+    return json.dumps(data)
+
+
+def test_parses_and_normalizes_a_full_record():
+    record = parse_minutes_record(_response(
+        subject="**Weekly Sync** ",
+        action_items=[{"task": " Ship ", "owner": "Alice", "due": None}, "Write docs"],
+        attendees=[" Alice ", "", "Bob"],
+    ))
+    assert record == {
+        "subject": "Weekly Sync",
+        "minutes": "Meeting Details\n\n    - shipped",
+        "action_items": [{"task": "Ship", "owner": "Alice", "due": ""},
+                         {"task": "Write docs", "owner": "", "due": ""}],
+        "attendees": ["Alice", "Bob"],
+    }
+
+
+def test_optional_fields_default_to_empty():
+    record = parse_minutes_record(_response(action_items=None))
+    assert record["action_items"] == [] and record["attendees"] == []
+
+
+@pytest.mark.parametrize("response_text", [
+    "not json",
+    "[1, 2]",
+    _response(subject=""),
+    _response(minutes=None),
+    _response(action_items=[{"owner": "Alice"}]),
+    _response(action_items=[42]),
+    _response(attendees="Alice, Bob"),
+    _response(attendees=["Alice", 3]),
+])
+def test_rejects_malformed_responses(response_text):
+    with pytest.raises(ValueError):
+        parse_minutes_record(response_text)
+
+
+def test_fallback_records_are_recognised():
+    notes = "raw notes"
+    assert is_fallback_record(notes, {"subject": SUBJECT_FALLBACK, "minutes": "anything"})
+    assert is_fallback_record(notes, {"subject": "Weekly Sync", "minutes": notes})
+    assert is_fallback_record(notes, {"subject": "Weekly Sync", "minutes": ""})
+    assert not is_fallback_record(notes, {"subject": "Weekly Sync", "minutes": "Meeting Details"})
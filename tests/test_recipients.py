@@ -0,0 +1,125 @@
+import pytest
+
+import agent_core
+import recipients
+from recipients import (
+    LocalResolver,
+    RecipientDirectory,
+    REJECT_ALIAS_LOOP,
+    REJECT_DOMAIN,
+    REJECT_SYNTAX,
+    load_alias_file,
+    normalize_address,
+)
+
+ALIASES = {
+    "eng-team": ["alice@example.com", "Bob <BOB@example.com>"],
+    "all-hands@example.com": ["eng-team", "carol@example.org", "all-hands@example.com"],
+    "loop-a": ["loop-b", "dave@example.com"],
+    "loop-b": ["loop-a"],
+}
+
+
+@pytest.fixture
+def resolver():
+    return LocalResolver(["example.com", "example.org"])
+
+
+@pytest.fixture
+def directory(resolver):
+    return RecipientDirectory(aliases=ALIASES, resolver=resolver)
+
+
+@pytest.mark.parametrize("entry, address", [
+    ("Alice@Example.COM", "alice@example.com"),
+    ("Alice Smith <Alice@Example.com>", "alice@example.com"),
+    ("mailto:bob@example.com", "bob@example.com"),
+    ("(carol@example.org);", "carol@example.org"),
+    ("eng-team", None),
+    ("", None),
+])
+def test_normalize_address(entry, address):
+    assert normalize_address(entry) == address
+
+
+def test_case_folded_duplicates_collapse(directory):
+    index, rejected = directory.resolve(["Alice@Example.com", "alice@example.com", "<ALICE@EXAMPLE.COM>"])
+    assert index.addresses() == ["alice@example.com"] and rejected == {}
+
+
+def test_aliases_expand_recursively(directory):
+    index, rejected = directory.resolve(["ALL-HANDS@example.com"])
+    # The list names its own mailbox, which is delivered to rather than expanded again.
+    assert index.addresses() == ["alice@example.com", "bob@example.com", "carol@example.org",
+                                 "all-hands@example.com"]
+    assert rejected == {}
+
+
+def test_alias_loop_is_reported(directory):
+    index, rejected = directory.resolve(["loop-a"])
+    assert index.addresses() == ["dave@example.com"]
+    assert rejected == {"loop-a": REJECT_ALIAS_LOOP}
+
+
+def test_syntax_errors_are_rejected(directory):
+    index, rejected = directory.resolve(["not an address", "a@b", "ok@example.com"])
+    assert index.addresses() == ["ok@example.com"]
+    assert rejected == {"not an address": REJECT_SYNTAX, "a@b": REJECT_SYNTAX}
+
+
+def test_domains_that_do_not_accept_mail_are_rejected(directory):
+    index, rejected = directory.resolve(["alice@example.com", "bob@typo.invalid", "carol@typo.invalid"])
+    assert index.addresses() == ["alice@example.com"]
+    assert rejected == {"bob@typo.invalid": REJECT_DOMAIN, "carol@typo.invalid": REJECT_DOMAIN}
+
+
+def test_domain_answers_are_cached_per_domain(directory, resolver):
+    entries = [f"user{i}@example.com" for i in range(50)] + ["x@example.org", "y@typo.invalid"]
+    directory.resolve(entries)
+    assert resolver.lookups == 3
+    directory.resolve(entries)
+    assert resolver.lookups == 3
+    assert directory.domain_cache_stats() == {"domains": 3, "rejecting": 1}
+
+
+def test_expired_domain_answers_are_looked_up_again(resolver):
+    directory = RecipientDirectory(resolver=resolver, cache_ttl=0)
+    directory.resolve(["a@example.com"])
+    directory.resolve(["a@example.com"])
+    assert resolver.lookups == 2
+
+
+def test_domain_checks_can_be_disabled(resolver):
+    directory = RecipientDirectory(resolver=resolver, check_domains=False)
+    index, rejected = directory.resolve(["bob@typo.invalid"])
+    assert index.addresses() == ["bob@typo.invalid"] and rejected == {}
+    assert resolver.lookups == 0
+
+
+def test_failing_resolver_accepts_the_domain():
+    def broken(domain):
+        raise OSError("resolver offline")
+    index, rejected = RecipientDirectory(resolver=broken).resolve(["a@example.com"])
+    assert index.addresses() == ["a@example.com"] and rejected == {}
+
+
+def test_exclude_drops_the_sender_silently(directory):
+    index, rejected = directory.resolve(["eng-team", "Me <ME@example.com>"], exclude=["me@example.com", "BOB@example.com"])
+    assert index.addresses() == ["alice@example.com"]
+    assert rejected == {}
+
+
+def test_alias_file(tmp_path):
+    path = tmp_path / "aliases.txt"
+    path.write_text("# team lists\nEng-Team: a@example.com, b@example.com\nbroken line\n"
+                    "eng-team: c@example.com  # continued\n", encoding="utf-8")
+    assert load_alias_file(str(path)) == {"eng-team": ["a@example.com", "b@example.com", "c@example.com"]}
+    assert load_alias_file(str(tmp_path / "missing.txt")) == {}
+
+
+def test_resolve_recipients_uses_the_shared_directory(monkeypatch, resolver):
+    monkeypatch.setattr(recipients, "_directory", RecipientDirectory(aliases=ALIASES, resolver=resolver))
+    accepted, rejected = agent_core.resolve_recipients(
+        ["Alice@example.com"], "eng-team, bob@typo.invalid", exclude=["alice@example.com"])
+    assert accepted == ["bob@example.com"]
+    assert rejected == {"bob@typo.invalid": REJECT_DOMAIN}
@@ -0,0 +1,73 @@
+from revisions import RevisionStore, diff_notes, split_sections, splice_sections
+
+MINUTES = """Weekly Sync
+
+Meeting Details
+    - Date: Monday
+
+Attendees
+    - Alice
+    - Bob
+
+Action Items
+    - Alice: ship the release"""
+
+
+def test_split_sections_keeps_preamble_and_headings():
+    sections = split_sections(MINUTES)
+    assert [section.heading for section in sections] == [None, "Meeting Details", "Attendees", "Action Items"]
+    assert sections[0].body.strip() == "Weekly Sync"
+    assert split_sections("just some text\n    - no headings") == []
+
+
+def test_splice_replaces_only_named_sections():
+    spliced = splice_sections(MINUTES, {"attendees:": "    - Alice\n    - Carol"})
+    assert "    - Carol" in spliced and "    - Bob" not in spliced
+    assert "    - Date: Monday" in spliced and "ship the release" in spliced
+    assert split_sections(spliced)[2].heading == "Attendees"
+
+
+def test_splice_appends_new_sections_and_round_trips():
+    spliced = splice_sections(MINUTES, {"Next Meeting": "    - Friday"})
+    assert spliced.startswith(MINUTES)
+    assert [section.heading for section in split_sections(spliced)][-1] == "Next Meeting"
+    assert splice_sections(MINUTES, {}) == MINUTES
+
+
+def test_splice_without_sections_returns_none():
+    assert splice_sections("plain text minutes", {"Attendees": "- Alice"}) is None
+
+
+def test_markdown_headings_and_bullets():
+    minutes = "## Summary\nstuff\n- Attendees\n## Decisions\nnone"
+    assert [section.heading for section in split_sections(minutes)] == ["## Summary", "## Decisions"]
+    assert splice_sections(minutes, {"# Decisions": "ship it"}) == "## Summary\nstuff\n- Attendees\n## Decisions\n\nship it"
+
+
+def test_diff_notes_reports_changed_sentences():
+    old = "We met. Alice ships Friday. Bob writes docs."
+    changes, changed = diff_notes(old, "We met. Alice ships Monday. Bob writes docs.")
+    assert changes == [("We met. Alice ships Friday. Bob writes docs.", "We met. Alice ships Monday. Bob writes docs.")]
+    assert 0 < changed < 0.5
+    assert diff_notes(old, old) == ([], 0.0)
+
+
+def test_store_finds_close_base_only():
+    store = RevisionStore(max_entries=2, max_change=0.5)
+    notes = "We met. Alice ships Friday. Bob writes docs."
+    store.remember(notes, {"subject": "Sync", "minutes": MINUTES})
+    record, changes = store.find_base(notes.replace("Friday", "Monday"))
+    assert record["subject"] == "Sync" and len(changes) == 1
+    assert store.find_base(notes) is None                       # identical notes are not an edit
+    assert store.find_base("Something else entirely.") is None
+
+
+def test_stores_are_independent_and_bounded():
+    first, second = RevisionStore(max_entries=2), RevisionStore(max_entries=2)
+    notes = "We met. Alice ships Friday. Bob writes docs. Carol reviews."
+    first.remember(notes, {"subject": "Sync", "minutes": MINUTES})
+    edited = notes.replace("Friday", "Monday")
+    assert second.find_base(edited) is None
+    first.remember("Other notes one.", {"subject": "a", "minutes": "a"})
+    first.remember("Other notes two.", {"subject": "b", "minutes": "b"})
+    assert first.find_base(edited) is None                      # evicted as the oldest run
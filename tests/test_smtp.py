@@ -0,0 +1,247 @@
+import re
+import threading
+import time
+
+import pytest
+
+import agent_core
+from agent_core import SMTPConnectionPool
+from bench_dispatch import SMTPSink, _SMTPSinkHandler
+from job_queue import JobQueue, STATE_PREVIEWED, STATE_SENT, send_job
+
+_ADDRESS_RE = re.compile(r"<([^>]*)>")
+
+
+class ScriptedHandler(_SMTPSinkHandler):
+    """
+    Sink handler driven by the server's script: per-address RCPT replies,
+    DATA replies, and connections dropped on MAIL or after a message. Each
+    accepted message's envelope is recorded.
+    """
+
+    def handle(self):
+        self.server.connections += 1
+        self.envelope = []
+        self.drop_next = False
+        try:
+            super().handle()
+        finally:
+            self.server.closed += 1
+
+    def reply_to(self, command):
+        server = self.server
+        if self.drop_next:
+            return None
+        if command.startswith("NOOP"):
+            server.noops += 1
+        elif command.startswith("MAIL"):
+            if server.drop_on_mail:
+                server.drop_on_mail -= 1
+                return None
+            self.envelope = []
+        elif command.startswith("RCPT"):
+            address = _ADDRESS_RE.search(command).group(1).lower()
+            replies = server.rcpt_replies.get(address)
+            reply = replies.pop(0) if replies and len(replies) > 1 else (replies or ["250 OK"])[0]
+            if reply.startswith("250"):
+                self.envelope.append(address)
+            return reply
+        return "250 OK"
+
+    def data_reply(self):
+        server = self.server
+        reply = server.data_replies.pop(0) if server.data_replies else "250 OK"
+        if reply.startswith("250"):
+            server.envelopes.append(self.envelope)
+        if server.drop_after_data:
+            server.drop_after_data -= 1
+            self.drop_next = True  # the next command on this connection finds it gone
+        return reply
+
+
+class ScriptedSink(SMTPSink):
+    def __init__(self):
+        super().__init__(handler=ScriptedHandler)
+        self.connections = self.closed = self.noops = 0
+        self.drop_on_mail = self.drop_after_data = 0
+        self.rcpt_replies = {}   # address -> replies, one per attempt; the last one repeats
+        self.data_replies = []
+        self.envelopes = []
+
+
+@pytest.fixture
+def sink():
+    server = ScriptedSink()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(sink, monkeypatch):
+    smtp_pool = SMTPConnectionPool("127.0.0.1", sink.server_address[1], use_starttls=False)
+    monkeypatch.setattr(agent_core, "_smtp_pool", smtp_pool)
+    monkeypatch.setattr(agent_core, "SMTP_RETRY_BACKOFF", 0.0)
+    yield smtp_pool
+    smtp_pool.close_idle()
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+MESSAGE = "Subject: test\r\n\r\nbody\r\n"
+
+
+# --- Connection pool ---
+
+def test_connections_are_reused(sink, pool):
+    for _ in range(3):
+        assert pool.sendmail("me@example.com", ["a@example.com"], MESSAGE) == {}
+    assert sink.connections == 1
+    assert sink.noops == 2  # each reuse is health-checked first
+    assert len(sink.envelopes) == 3
+
+
+def test_dead_idle_connection_is_replaced(sink, pool):
+    sink.drop_after_data = 1
+    pool.sendmail("me@example.com", ["a@example.com"], MESSAGE)
+    # The pooled connection fails its NOOP check, so a fresh one is opened.
+    pool.sendmail("me@example.com", ["b@example.com"], MESSAGE)
+    assert sink.connections == 2
+    assert sink.envelopes == [["a@example.com"], ["b@example.com"]]
+
+
+def test_disconnect_during_send_reconnects_once(sink, pool):
+    sink.drop_on_mail = 1
+    assert pool.sendmail("me@example.com", ["a@example.com"], MESSAGE) == {}
+    assert sink.connections == 2
+    assert sink.envelopes == [["a@example.com"]]
+
+
+def test_idle_connections_are_reaped(sink):
+    smtp_pool = SMTPConnectionPool("127.0.0.1", sink.server_address[1], use_starttls=False, idle_timeout=0.2)
+    smtp_pool.sendmail("me@example.com", ["a@example.com"], MESSAGE)
+    assert len(smtp_pool._idle) == 1
+    assert _wait_for(lambda: not smtp_pool._idle and sink.closed == 1)
+
+
+def test_expired_connection_is_not_reused(sink):
+    smtp_pool = SMTPConnectionPool("127.0.0.1", sink.server_address[1], use_starttls=False, idle_timeout=0.05)
+    server = smtp_pool.acquire()
+    smtp_pool._idle.append((server, time.monotonic() - 1))  # released long ago, reaper not yet run
+    assert smtp_pool.acquire() is not server
+    assert sink.connections == 2 and sink.noops == 0
+    smtp_pool.close_idle()
+
+
+def test_pool_keeps_at_most_max_size_connections(sink):
+    smtp_pool = SMTPConnectionPool("127.0.0.1", sink.server_address[1], use_starttls=False, max_size=1)
+    first, second = smtp_pool.acquire(), smtp_pool.acquire()
+    smtp_pool.release(first)
+    smtp_pool.release(second)
+    assert len(smtp_pool._idle) == 1
+    assert _wait_for(lambda: sink.closed == 1)
+    smtp_pool.close_idle()
+    assert _wait_for(lambda: sink.closed == 2)
+
+
+# --- Per-recipient delivery report ---
+
+PRIMARY = "me@example.com"
+
+
+def _deliver(cc, **kwargs):
+    return agent_core.send_email_bulk(PRIMARY, cc, "Weekly Sync", "body", **kwargs)
+
+
+def test_single_message_delivers_everyone(sink, pool):
+    report = agent_core.deliver_email(PRIMARY, ["a@example.com", "b@example.com"], "Weekly Sync", "body")
+    assert report == {"delivered": [PRIMARY, "a@example.com", "b@example.com"], "refused": {}, "failed": {},
+                      "batches": 1}
+    assert sink.envelopes == [[PRIMARY, "a@example.com", "b@example.com"]]
+
+
+def test_transient_refusal_is_retried_for_that_recipient_only(sink, pool):
+    sink.rcpt_replies["b@example.com"] = ["451 try again later", "250 OK"]
+    report = _deliver(["a@example.com", "b@example.com"])
+    assert sorted(report["delivered"]) == sorted([PRIMARY, "a@example.com", "b@example.com"])
+    assert report["failed"] == {} and report["refused"] == {}
+    assert sink.envelopes == [[PRIMARY, "a@example.com"], ["b@example.com"]]
+
+
+def test_transient_refusal_that_persists_is_failed(sink, pool):
+    sink.rcpt_replies["b@example.com"] = ["451 mailbox busy"]
+    report = _deliver(["a@example.com", "b@example.com"])
+    assert report["failed"] == {"b@example.com": "451 mailbox busy"}
+    assert len(sink.envelopes) == 1  # only the first attempt had anyone to deliver to
+    assert sink.recipients == 3 + (agent_core.SMTP_BATCH_ATTEMPTS - 1)
+
+
+def test_permanent_refusal_is_reported_not_retried(sink, pool):
+    sink.rcpt_replies["c@example.com"] = ["550 no such user"]
+    report = _deliver(["a@example.com", "c@example.com"])
+    assert report["refused"] == {"c@example.com": "550 no such user"}
+    assert report["failed"] == {}
+    assert sink.recipients == 3
+    # Refused addresses are reported, but the send still counts as a success.
+    sink.rcpt_replies["c@example.com"] = ["550 no such user"]
+    assert agent_core.send_email_collective(PRIMARY, ["a@example.com", "c@example.com"], "s", "body")
+
+
+def test_whole_batch_permanent_failure_refuses_everyone(sink, pool):
+    sink.data_replies = ["554 message rejected as spam"]
+    report = _deliver(["a@example.com", "b@example.com"])
+    assert report["delivered"] == [] and report["failed"] == {}
+    assert report["refused"] == {address: "554 message rejected as spam"
+                                 for address in (PRIMARY, "a@example.com", "b@example.com")}
+    assert sink.messages == 1
+
+
+def test_whole_batch_transient_failure_is_retried(sink, pool):
+    sink.data_replies = ["451 local error"]
+    report = _deliver(["a@example.com"])
+    assert sorted(report["delivered"]) == sorted([PRIMARY, "a@example.com"])
+    assert sink.messages == 2
+
+
+def test_bulk_batches_dedupe_and_primary_in_first_batch_only(sink, pool):
+    cc = ["A@example.com", "a@example.com", "b@example.com", "me@EXAMPLE.com", "c@example.com",
+          "d@example.com", "e@example.com"]
+    report = _deliver(cc, batch_size=2)
+    assert report["batches"] == 3
+    assert sorted(report["delivered"]) == sorted([PRIMARY] + [f"{c}@example.com" for c in "abcde"])
+    assert sorted(sink.envelopes) == sorted([[PRIMARY, "a@example.com", "b@example.com"],
+                                             ["c@example.com", "d@example.com"], ["e@example.com"]])
+
+
+def test_bcc_mode_hides_the_list(sink, pool, monkeypatch):
+    messages = []
+    original = agent_core._build_message
+    monkeypatch.setattr(agent_core, "_build_message", lambda *args: messages.append(original(*args)) or messages[-1])
+    _deliver(["a@example.com", "b@example.com"], batch_size=1)
+    assert messages and all("Cc:" not in message for message in messages)
+    messages.clear()
+    agent_core.deliver_email(PRIMARY, ["a@example.com", "b@example.com"], "s", "body")
+    assert "Cc: a@example.com, b@example.com" in messages[0]
+
+
+def test_queue_retries_only_recipients_that_missed_out(sink, pool, tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job = jobs.enqueue("notes", PRIMARY, ["a@example.com", "b@example.com", "c@example.com"])
+    jobs.mark_summarized(job["id"], "Weekly Sync", "minutes")
+    jobs.mark_previewed(job["id"])
+    sink.rcpt_replies["c@example.com"] = ["451 busy", "451 busy", "451 busy", "250 OK"]
+
+    assert not send_job(jobs, jobs.get(job["id"]))
+    job = jobs.get(job["id"])
+    assert job["state"] == STATE_PREVIEWED and job["cc"] == ["c@example.com"]
+
+    assert send_job(jobs, job)
+    assert jobs.get(job["id"])["state"] == STATE_SENT
+    # a and b got the first send; the resend goes only to c (plus the sender's own copy).
+    assert sink.envelopes == [[PRIMARY, "a@example.com", "b@example.com"], [PRIMARY, "c@example.com"]]
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from agent_core import TextScanner, clean_and_extract, clean_text, scan_text_pieces, scan_text_stream
+
+TEXT = ("Attendees: Alice <alice@example.com>,  Bob (BOB@Example.com)\n\n"
+        "Action:\tcarol@example.org to follow up; alice@example.com owns docs.\n")
+
+
+def test_matches_clean_text_and_dedupes_case_insensitively():
+    cleaned, emails = clean_and_extract(TEXT)
+    assert cleaned == clean_text(TEXT)
+    assert emails == ["alice@example.com", "bob@example.com", "carol@example.org"]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64])
+def test_chunk_boundaries_do_not_change_the_result(size):
+    # Every split point lands somewhere: inside words, addresses and whitespace runs.
+    pieces = [TEXT[i:i + size] for i in range(0, len(TEXT), size)]
+    assert scan_text_pieces(pieces) == clean_and_extract(TEXT)
+
+
+def test_address_split_across_feeds_is_found_once():
+    scanner = TextScanner()
+    output = scanner.feed("mail ali") + scanner.feed("ce@exam") + scanner.feed("ple.com now") + scanner.finish()
+    assert output == "mail alice@example.com now"
+    assert scanner.emails == ["alice@example.com"]
+
+
+def test_whitespace_only_and_empty_input():
+    assert clean_and_extract("") == ("", [])
+    assert scan_text_pieces([" \n", " \t", ""]) == ("", [])
+    assert scan_text_pieces(["  lead", "ing  ", "  trail  "]) == ("leading trail", [])
+
+
+def test_stream_reads_in_chunks():
+    assert scan_text_stream(io.StringIO(TEXT), chunk_size=4) == clean_and_extract(TEXT)